@@ -0,0 +1,114 @@
+"""Pre-aggregated cube of dashboard metrics over the categorical dimensions
+
+The cube stores, for every observed combination of dimension values, the row
+count plus the count, sum and sum of squares of each numeric metric. Means,
+counts, shares and standard deviations for any grouping of those dimensions
+are then rolled up from a few thousand cells instead of rescanning the rows.
+"""
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ('Age Group', 'Occupation', 'Sleep Disorder Status', 'Gender',
+                   'BMI Category', 'Activity Level', 'Sleep Quality Category')
+
+CUBE_METRICS = ('Age', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level',
+                'Stress Level', 'Heart Rate', 'Daily Steps', 'Sleep Efficiency')
+
+ROWS = 'rows'
+
+
+def _col(metric, stat):
+    return f'{metric}:{stat}'
+
+
+class AggregateCube:
+    """Mergeable (count, sum, sum of squares) aggregates keyed by dimension values"""
+
+    def __init__(self, cells=None, dimensions=CUBE_DIMENSIONS, metrics=CUBE_METRICS):
+        # ``cells=None`` is an empty cube to be filled with :meth:`add`
+        self.cells = cells
+        self.dimensions = tuple(dimensions)
+        self.metrics = tuple(metrics)
+
+    @classmethod
+    def from_frame(cls, df, dimensions=CUBE_DIMENSIONS, metrics=CUBE_METRICS):
+        """Aggregate the rows of ``df`` into cube cells"""
+        dimensions = [d for d in dimensions if d in df.columns]
+        values = df[list(metrics)].astype('float64')
+        parts = [df[dimensions]]
+        for metric in metrics:
+            column = values[metric]
+            parts.append(column.notna().astype('int64').rename(_col(metric, 'n')))
+            parts.append(column.rename(_col(metric, 'sum')))
+            parts.append((column * column).rename(_col(metric, 'sumsq')))
+        frame = pd.concat(parts, axis=1)
+        frame[ROWS] = 1
+        cells = (frame.groupby(dimensions, observed=True, dropna=False, sort=False)
+                 .sum().reset_index())
+        return cls(cells, dimensions, metrics)
+
+    def merge(self, other):
+        """Combine two cubes built over disjoint sets of rows"""
+        if self.cells is None:
+            return AggregateCube(other.cells, self.dimensions, self.metrics)
+        cells = pd.concat([self.cells, other.cells], ignore_index=True)
+        cells = (cells.groupby(list(self.dimensions), observed=True, dropna=False, sort=False)
+                 .sum().reset_index())
+        return AggregateCube(cells, self.dimensions, self.metrics)
+
+    def add(self, batch):
+        """Fold a batch of new rows into the cube (in place)"""
+        batch_cube = AggregateCube.from_frame(batch, self.dimensions, self.metrics)
+        self.cells = self.merge(batch_cube).cells
+        return self
+
+    def where(self, selection):
+        """Restrict the cube to cells matching ``{dimension: value or collection of values}``"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dimension, value in selection.items():
+            if isinstance(value, (list, tuple, set, frozenset)):
+                mask &= self.cells[dimension].isin(list(value)).to_numpy()
+            else:
+                mask &= (self.cells[dimension] == value).to_numpy()
+        return AggregateCube(self.cells[mask], self.dimensions, self.metrics)
+
+    def _rollup(self, by, columns):
+        if by is None:
+            return self.cells[columns].sum()
+        return self.cells.groupby(by, observed=True)[columns].sum()
+
+    def count(self, by=None):
+        """Row count overall, or per value of ``by``"""
+        return self._rollup(by, [ROWS])[ROWS]
+
+    def mean(self, metrics, by=None):
+        """Mean of one metric (Series/scalar) or a list of metrics (DataFrame/Series)"""
+        names = [metrics] if isinstance(metrics, str) else list(metrics)
+        columns = [_col(m, stat) for m in names for stat in ('n', 'sum')]
+        totals = self._rollup(by, columns)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = {m: totals[_col(m, 'sum')] / totals[_col(m, 'n')] for m in names}
+        if by is None:
+            result = pd.Series(means, dtype='float64')
+        else:
+            result = pd.DataFrame(means)
+        return result[metrics] if isinstance(metrics, str) else result
+
+    def std(self, metric, by=None):
+        """Sample standard deviation (ddof=1, as pandas) of ``metric``"""
+        columns = [_col(metric, stat) for stat in ('n', 'sum', 'sumsq')]
+        totals = self._rollup(by, columns)
+        n = totals[_col(metric, 'n')]
+        total = totals[_col(metric, 'sum')]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (totals[_col(metric, 'sumsq')] - total * total / n) / (n - 1)
+        return np.sqrt(np.maximum(variance, 0))
+
+    def share(self, rows, columns):
+        """Percentage of ``columns`` values within each ``rows`` value
+
+        Equivalent to ``pd.crosstab(df[rows], df[columns], normalize='index') * 100``.
+        """
+        counts = self.cells.groupby([rows, columns], observed=True)[ROWS].sum()
+        table = counts.unstack(columns, fill_value=0)
+        return table.div(table.sum(axis=1), axis=0) * 100
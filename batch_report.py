@@ -0,0 +1,241 @@
+"""Headless batch reports: the dashboard's analyses for every value of a dimension
+
+Renders the overview, occupation, correlation and demographics charts for
+each segment (for example one report per Occupation) to a static HTML page,
+and optionally to PNG files. Segments are rendered in parallel by a process
+pool. The parent builds the columnar cache once; each worker memory-maps it
+(see ``data_cache.load_preprocessed``), so the frame is never pickled to the
+workers — tasks carry only the segment value.
+
+Usage:
+    python batch_report.py --by Occupation --output reports
+    python batch_report.py --by "Age Group" --format html png --workers 8
+"""
+import argparse
+import html
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+import charts
+from aggregates import AggregateCube
+from correlation import MomentAccumulator
+from data_cache import CACHE_DIR, load_preprocessed
+
+SOURCE_CSV = 'Sleep_health_and_lifestyle_dataset.csv'
+PLOTLY_BUNDLE = 'plotly.min.js'
+FORMATS = ('html', 'png')
+
+try:
+    import kaleido  # noqa: F401  (used by plotly's write_image)
+    KALEIDO_AVAILABLE = True
+except ImportError:
+    KALEIDO_AVAILABLE = False
+
+
+def report_sections(segment_df, cube, correlation_matrix):
+    """Charts of each dashboard section, as ``{section: [(chart id, build)]}``"""
+    return {
+        'Overview': [
+            ('disorder_pie', lambda: charts.disorder_pie(cube)),
+            ('quality_bar', lambda: charts.sleep_quality_bar(cube)),
+            ('duration_histogram', lambda: charts.sleep_duration_histogram(segment_df, cube)),
+        ],
+        'Occupation Analysis': [
+            ('occupation_sleep', lambda: charts.occupation_sleep_bar(cube)),
+            ('occupation_quality', lambda: charts.occupation_quality_bar(cube)),
+            ('occupation_stress', lambda: charts.occupation_stress_bar(cube)),
+            ('occupation_disorder', lambda: charts.occupation_disorder_bar(cube)),
+        ],
+        'Correlations': [
+            ('correlation_heatmap', lambda: charts.correlation_heatmap(correlation_matrix)),
+            ('sleep_correlations', lambda: charts.correlation_bar(
+                correlation_matrix, 'Sleep Duration', "Correlations with Sleep Duration")),
+            ('quality_correlations', lambda: charts.correlation_bar(
+                correlation_matrix, 'Quality of Sleep', "Correlations with Sleep Quality")),
+        ] + [
+            (f'relationship_{slugify(name)}', lambda name=name: charts.relationship_scatter(segment_df, name))
+            for name in charts.RELATIONSHIPS
+        ],
+        'Demographics': [
+            ('age_metrics', lambda: charts.age_metrics_bar(cube)),
+            ('age_disorder', lambda: charts.age_disorder_bar(cube)),
+            ('gender_sleep', lambda: charts.gender_sleep_bar(cube)),
+            ('gender_disorder', lambda: charts.gender_disorder_bar(cube)),
+            ('activity_metrics', lambda: charts.activity_metrics_bar(cube)),
+        ],
+    }
+
+
+def slugify(value):
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(value)).strip('-').lower() or 'segment'
+
+
+def segment_slugs(values):
+    """File-safe, unique slug for each segment value"""
+    slugs, seen = {}, set()
+    for value in values:
+        slug = base = slugify(value)
+        suffix = 2
+        while slug in seen:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        seen.add(slug)
+        slugs[value] = slug
+    return slugs
+
+
+def summary_metrics(cube):
+    means = cube.mean(['Sleep Duration', 'Quality of Sleep', 'Stress Level'])
+    counts = cube.count('Sleep Disorder Status')
+    disorder_rate = (1 - counts.get('No Disorder', 0) / counts.sum()) * 100
+    return {
+        'Participants': f"{int(counts.sum()):,}",
+        'Average Sleep Duration': f"{means['Sleep Duration']:.2f} hours",
+        'Average Sleep Quality': f"{means['Quality of Sleep']:.1f}/10",
+        'Average Stress Level': f"{means['Stress Level']:.1f}/10",
+        'Sleep Disorder Rate': f"{disorder_rate:.1f}%",
+    }
+
+
+def render_page(title, metrics, sections):
+    """Static HTML page; figures share the plotly bundle next to the page"""
+    parts = [
+        '<!DOCTYPE html>', '<html><head><meta charset="utf-8">',
+        f'<title>{html.escape(title)}</title>',
+        f'<script src="{PLOTLY_BUNDLE}"></script>', '</head><body>',
+        f'<h1>{html.escape(title)}</h1>', '<ul>',
+    ]
+    parts += [f'<li><b>{html.escape(k)}:</b> {html.escape(v)}</li>' for k, v in metrics.items()]
+    parts.append('</ul>')
+    for section, figures in sections.items():
+        parts.append(f'<h2>{html.escape(section)}</h2>')
+        for fig, note in figures:
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=False))
+            if note:
+                parts.append(f'<p><i>{html.escape(note)}</i></p>')
+    parts.append('</body></html>')
+    return '\n'.join(parts)
+
+
+# Worker state, set once per process by _init_worker
+_df = None
+_groups = None
+_job = None
+
+
+def _init_worker(csv_path, cache_dir, by, job):
+    global _df, _groups, _job
+    # Warm cache: the Arrow file is memory-mapped, not copied or unpickled
+    _df = load_preprocessed(csv_path, cache_dir)
+    _groups = _df.groupby(by, observed=True, sort=False).indices
+    _job = job
+
+
+def _render_segment(value):
+    """Render one segment's report; returns ``(value, rows, files, seconds)``"""
+    start = time.perf_counter()
+    by, output, formats, slug = _job['by'], Path(_job['output']), _job['formats'], _job['slugs'][value]
+    segment_df = _df.take(_groups[value])
+    cube = AggregateCube.from_frame(segment_df)
+    correlation_matrix = MomentAccumulator.from_frame(segment_df).correlation()
+
+    sections = {}
+    files = []
+    for section, builders in report_sections(segment_df, cube, correlation_matrix).items():
+        figures = []
+        for chart_id, build in builders:
+            result = build()
+            fig, note = result if isinstance(result, tuple) else (result, None)
+            figures.append((fig, note))
+            if 'png' in formats:
+                png_path = output / slug / f'{chart_id}.png'
+                png_path.parent.mkdir(parents=True, exist_ok=True)
+                fig.write_image(png_path)
+                files.append(str(png_path))
+        sections[section] = figures
+
+    if 'html' in formats:
+        page = render_page(f"Sleep Health Report: {by} = {value}", summary_metrics(cube), sections)
+        html_path = output / f'{slug}.html'
+        html_path.write_text(page, encoding='utf-8')
+        files.append(str(html_path))
+    return value, len(segment_df), files, time.perf_counter() - start
+
+
+def write_index(output, by, results, slugs):
+    rows = ''.join(
+        f'<tr><td><a href="{slugs[value]}.html">{html.escape(str(value))}</a></td>'
+        f'<td>{n:,}</td></tr>'
+        for value, n, _, _ in results)
+    page = (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Reports by {html.escape(by)}</title>'
+            f'</head><body><h1>Sleep Health Reports by {html.escape(by)}</h1>'
+            f'<table><tr><th>{html.escape(by)}</th><th>Participants</th></tr>{rows}</table></body></html>')
+    (output / 'index.html').write_text(page, encoding='utf-8')
+
+
+def run(csv_path, by, output, formats=('html',), workers=None, cache_dir=CACHE_DIR):
+    """Render every segment of ``by``; returns ``[(value, rows, files, seconds)]``"""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    # Build (or validate) the columnar cache once, before the workers map it
+    df = load_preprocessed(csv_path, cache_dir)
+    if by not in df.columns:
+        raise KeyError(f"Unknown dimension {by!r}")
+    values = list(pd.unique(df[by].dropna()))
+    del df
+
+    slugs = segment_slugs(values)
+    job = {'by': by, 'output': str(output), 'formats': tuple(formats), 'slugs': slugs}
+    if 'html' in formats:
+        (output / PLOTLY_BUNDLE).write_text(get_plotlyjs(), encoding='utf-8')
+
+    workers = workers or os.cpu_count() or 1
+    initargs = (str(csv_path), str(cache_dir), by, job)
+    if workers == 1:
+        _init_worker(*initargs)
+        results = [_render_segment(value) for value in values]
+    else:
+        chunksize = max(1, len(values) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=initargs) as pool:
+            results = list(pool.map(_render_segment, values, chunksize=chunksize))
+
+    if 'html' in formats:
+        write_index(output, by, results, slugs)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--by', required=True, help='dimension to split on, e.g. Occupation')
+    parser.add_argument('--csv', default=SOURCE_CSV, help='source CSV (default: %(default)s)')
+    parser.add_argument('--output', default='reports', help='output directory (default: %(default)s)')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['html'], dest='formats',
+                        help='output formats; png needs the optional kaleido package')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    if 'png' in args.formats and not KALEIDO_AVAILABLE:
+        parser.error("PNG output needs kaleido: pip install kaleido")
+
+    start = time.perf_counter()
+    try:
+        results = run(args.csv, args.by, args.output, args.formats, args.workers)
+    except KeyError as exc:
+        parser.error(exc.args[0])
+    total = time.perf_counter() - start
+    for value, rows, files, seconds in results:
+        print(f"{str(value):<30} {rows:>8,} rows  {len(files):>3} files  {seconds:6.2f}s", file=sys.stderr)
+    print(f"{len(results)} reports by {args.by} in {total:.1f}s -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""Benchmark the dashboard's data and chart pipeline at scale, without a browser
+
+Generates synthetic datasets shaped like Sleep_health_and_lifestyle_dataset.csv
+(rows bootstrapped from the real file) and times each stage: loading, building
+the derived structures, sidebar filtering, and each tab's aggregation, figure
+construction and serialization. Results are written as JSON lines, one record
+per (rows, stage), so runs from different commits can be compared.
+
+``--startup`` measures cold start instead: each run starts a fresh interpreter
+that executes the dashboard's first run headlessly under ``-X importtime``,
+recording the time until the first page is complete and the cumulative
+import time of every module the script pulls in.
+
+Usage:
+    python benchmark.py --sizes 1000 100000 1000000 --output bench.jsonl
+    python benchmark.py --startup --repeat 5 --output startup.jsonl
+    python benchmark.py --compare before.jsonl after.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import charts
+from aggregates import AggregateCube
+from correlation import MomentAccumulator, SegmentedMoments
+from data_cache import load_preprocessed, read_source
+from density import DensityGrids
+from filter_index import FilterIndex, apply_filters
+
+SOURCE_CSV = 'Sleep_health_and_lifestyle_dataset.csv'
+DASHBOARD_SCRIPT = 'streamlit_dashboard.py'
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# Imports faster than this are left out of the startup records
+MIN_IMPORT_SECONDS = 0.001
+
+# Run in a fresh interpreter; imports logged after the marker are the script's
+STARTUP_MARKER = '-- first run --'
+STARTUP_PROBE = f"""
+import resource, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=600)
+print({STARTUP_MARKER!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+app.run()
+seconds = time.perf_counter() - start
+if app.exception:
+    sys.exit(str(app.exception))
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+"""
+
+# Representative sidebar selections, labelled for the stage names
+SELECTIONS = {
+    'all': {},
+    'nurse': {'Occupation': ['Nurse']},
+    'nurse-40s-apnea': {'Age Group': ['40-49'], 'Occupation': ['Nurse'],
+                        'Sleep Disorder Status': ['Sleep Apnea']},
+    'multi-select': {'Occupation': ['Nurse', 'Doctor', 'Engineer'], 'Gender': ['Female'],
+                     'BMI Category': ['Normal', 'Overweight']},
+    'ranges': {'Age': (30, 50), 'Daily Steps': (4000, 8000), 'Heart Rate': (65, 75)},
+    'mixed': {'Occupation': ['Nurse', 'Doctor'], 'Sleep Disorder Status': ['No Disorder'],
+              'Age': (30, 45), 'Stress Level': (3, 6)},
+}
+
+
+def synthetic_csv(rows, directory, source=SOURCE_CSV, seed=0):
+    """Write ``rows`` rows bootstrapped from ``source`` and return the path"""
+    base = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), size=rows)].reset_index(drop=True)
+    df['Person ID'] = np.arange(1, rows + 1)
+    path = Path(directory) / f'sleep_{rows}.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+def tab_stages(filtered_df, cube, moments):
+    """Figure builders for each dashboard tab, as ``{stage: build}``"""
+    correlation_matrix = moments.correlation()
+    return {
+        'tab.overview': lambda: [charts.disorder_pie(cube), charts.sleep_quality_bar(cube),
+                                 charts.sleep_duration_histogram(filtered_df, cube)[0]],
+        'tab.occupation': lambda: [charts.occupation_sleep_bar(cube), charts.occupation_quality_bar(cube),
+                                   charts.occupation_stress_bar(cube), charts.occupation_disorder_bar(cube)],
+        'tab.correlation': lambda: [
+            charts.correlation_heatmap(moments.correlation()),
+            charts.correlation_bar(correlation_matrix, 'Sleep Duration', "Correlations with Sleep Duration"),
+            charts.correlation_bar(correlation_matrix, 'Quality of Sleep', "Correlations with Sleep Quality"),
+            charts.relationship_scatter(filtered_df, "Sleep Duration vs Quality")[0]],
+        'tab.demographics': lambda: [charts.age_metrics_bar(cube), charts.age_disorder_bar(cube),
+                                     charts.gender_sleep_bar(cube), charts.gender_disorder_bar(cube),
+                                     charts.activity_metrics_bar(cube)],
+        'tab.explorer': lambda: [
+            charts.custom_chart(filtered_df, cube, chart_type, 'Sleep Duration', 'Stress Level',
+                                'Sleep Disorder Status')[0]
+            for chart_type in ('Scatter Plot', 'Box Plot', 'Histogram', 'Bar Chart')],
+    }
+
+
+def relationship_densities(density, predicates, filtered_df):
+    """Density heatmap of every relationship, combined from the segment grids when possible"""
+    if not set(predicates) <= set(density.segment_columns):
+        density = DensityGrids.from_frame(filtered_df, density.pairs, segment_columns=(), axes=density.axes)
+        predicates = {}
+    figures = []
+    for name, spec in charts.RELATIONSHIPS.items():
+        pair = (spec['x'], spec['y'])
+        figures.append(charts.relationship_density(density.where(pair, predicates), density.axes[pair[0]],
+                                                   density.axes[pair[1]], name)[0])
+    return figures
+
+
+def measure(fn, repeat):
+    """Best-of-``repeat`` wall time, then one traced run for peak memory"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def run_size(rows, workdir, repeat):
+    """Yield one record per stage for a dataset of ``rows`` rows"""
+    csv_path = synthetic_csv(rows, workdir)
+    cache_dir = Path(workdir) / f'cache_{rows}'
+
+    def record(stage, fn, stage_repeat=repeat):
+        result, seconds, peak = measure(fn, stage_repeat)
+        return result, {'rows': rows, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak}
+
+    _, rec = record('load.csv', lambda: read_source(csv_path))
+    yield rec
+    # Every cold call gets an empty cache directory, so each one rebuilds
+    _, rec = record('load.cache_build',
+                    lambda: load_preprocessed(csv_path, tempfile.mkdtemp(dir=workdir)))
+    yield rec
+    load_preprocessed(csv_path, cache_dir)
+    df, rec = record('load.cache_warm', lambda: load_preprocessed(csv_path, cache_dir))
+    yield rec
+
+    index, rec = record('build.filter_index', lambda: FilterIndex(df))
+    yield rec
+    full_cube, rec = record('build.aggregate_cube', lambda: AggregateCube.from_frame(df))
+    yield rec
+    segments, rec = record('build.segmented_moments', lambda: SegmentedMoments.from_frame(df))
+    yield rec
+    density, rec = record('build.density_grids',
+                          lambda: DensityGrids.from_frame(df, charts.relationship_pairs()))
+    yield rec
+
+    for label, selection in SELECTIONS.items():
+        predicates = dict(index.normalize(selection))
+
+        def resolve():
+            # Drop memoized lookups so each repeat resolves the filters again
+            index.clear_cache()
+            return apply_filters(df, index, selection)
+
+        filtered_df, rec = record(f'filter[{label}]', resolve)
+        yield rec
+        # Range predicates are not cube dimensions; as in the dashboard, fall
+        # back to the filtered rows for those
+        if set(predicates) <= set(full_cube.dimensions):
+            cube, moments = full_cube.where(predicates), segments.where(predicates)
+        else:
+            cube, moments = AggregateCube.from_frame(filtered_df), MomentAccumulator.from_frame(filtered_df)
+        _, rec = record(f'relationship.scatter[{label}]', lambda: [
+            charts.relationship_scatter(filtered_df, name)[0] for name in charts.RELATIONSHIPS])
+        yield rec
+        _, rec = record(f'relationship.density[{label}]',
+                        lambda: relationship_densities(density, predicates, filtered_df))
+        yield rec
+        for stage, build in tab_stages(filtered_df, cube, moments).items():
+            figures, rec = record(f'{stage}.build[{label}]', build)
+            yield rec
+            _, rec = record(f'{stage}.serialize[{label}]', lambda: [fig.to_json() for fig in figures])
+            yield rec
+
+
+def script_imports(importtime_log):
+    """Cumulative seconds of each top-level import after the probe's marker"""
+    imports = {}
+    for line in importtime_log.split(STARTUP_MARKER, 1)[1].splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the import that triggered them
+        if cumulative.strip().isdigit() and not name[1:].startswith(' '):
+            seconds = int(cumulative) / 1e6
+            if seconds >= MIN_IMPORT_SECONDS:
+                imports[name.strip()] = seconds
+    return imports
+
+
+def run_startup(repeat, cache_dir):
+    """Yield first-run and per-module import records, best of ``repeat`` cold starts"""
+    rows = len(pd.read_csv(SOURCE_CSV))
+    env = dict(os.environ, SLEEP_DASHBOARD_CACHE_DIR=str(cache_dir))
+    best = {}
+    # The first start builds the columnar cache and is not counted
+    for attempt in range(repeat + 1):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_PROBE, DASHBOARD_SCRIPT],
+                              capture_output=True, text=True, env=env, cwd=Path(__file__).parent)
+        if proc.returncode:
+            raise RuntimeError(f"Dashboard first run failed:\n{proc.stderr[-2000:]}")
+        if attempt == 0:
+            continue
+        seconds, peak = proc.stdout.split()
+        timings = {'startup.first_run': (float(seconds), int(peak))}
+        timings.update((f'startup.import[{name}]', (s, 0))
+                       for name, s in script_imports(proc.stderr).items())
+        for stage, timing in timings.items():
+            best[stage] = min(best.get(stage, timing), timing)
+    for stage, (seconds, peak) in best.items():
+        yield {'rows': rows, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'platform': platform.platform()}
+
+
+def compare(before_path, after_path):
+    """Print per-stage wall time and peak memory ratios between two result files"""
+    def read(path):
+        records = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+        return {(r['rows'], r['stage']): r for r in records if 'stage' in r}
+
+    before, after = read(before_path), read(after_path)
+    print(f"{'rows':>10}  {'stage':<50} {'before s':>10} {'after s':>10} {'ratio':>7} {'mem ratio':>9}")
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key], after[key]
+        ratio = a['seconds'] / b['seconds'] if b['seconds'] else float('nan')
+        mem_ratio = a['peak_bytes'] / b['peak_bytes'] if b['peak_bytes'] else float('nan')
+        print(f"{key[0]:>10}  {key[1]:<50} {b['seconds']:>10.4f} {a['seconds']:>10.4f} "
+              f"{ratio:>7.2f} {mem_ratio:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='dataset sizes in rows (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (best is kept)')
+    parser.add_argument('--output', help='append JSON lines here instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files and exit')
+    parser.add_argument('--startup', action='store_true',
+                        help="measure the dashboard's cold start instead of the pipeline")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        out.write(json.dumps({'environment': environment()}) + '\n')
+        with tempfile.TemporaryDirectory() as workdir:
+            if args.startup:
+                records = run_startup(args.repeat, workdir)
+            else:
+                records = (rec for rows in args.sizes for rec in run_size(rows, workdir, args.repeat))
+            for rec in records:
+                out.write(json.dumps(rec) + '\n')
+                out.flush()
+                if out is not sys.stdout:
+                    print(f"{rec['rows']:>10}  {rec['stage']:<50} {rec['seconds']:.4f}s "
+                          f"{rec['peak_bytes'] / 2**20:8.1f} MiB", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Figure builders for the dashboard sections
+
+Each builder takes the pre-aggregated inputs (cube, correlation matrix or
+filtered rows) and returns a Plotly figure, or ``(figure, note)`` for charts
+drawn through the render budget. Nothing here touches Streamlit, so the
+figures can be cached, benchmarked or rendered headless.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import render_budget
+
+SLEEP_METRICS = ['Sleep Duration', 'Quality of Sleep', 'Stress Level']
+
+# "Key Relationships" scatter options in the Correlations section
+RELATIONSHIPS = {
+    "Sleep Duration vs Quality": dict(
+        x='Sleep Duration', y='Quality of Sleep', color='Sleep Disorder Status',
+        size='Physical Activity Level', hover_data=['Age', 'Occupation'],
+        title="Sleep Duration vs Quality"),
+    "Stress vs Sleep Duration": dict(
+        x='Stress Level', y='Sleep Duration', color='Sleep Disorder Status',
+        size='Age', hover_data=['Occupation'], title="Stress Level vs Sleep Duration"),
+    "Daily Steps vs Sleep Duration": dict(
+        x='Daily Steps', y='Sleep Duration', color='Activity Level',
+        size='Physical Activity Level', hover_data=['Age', 'Occupation'],
+        title="Daily Steps vs Sleep Duration"),
+    "Age vs Sleep Duration": dict(
+        x='Age', y='Sleep Duration', color='Sleep Disorder Status',
+        size='Quality of Sleep', hover_data=['Occupation'], title="Age vs Sleep Duration"),
+}
+
+
+# Overview
+
+def disorder_pie(cube):
+    disorder_counts = cube.count('Sleep Disorder Status').sort_values(ascending=False)
+    fig = px.pie(values=disorder_counts.values, names=disorder_counts.index,
+                 title="Sleep Disorder Distribution",
+                 color_discrete_sequence=px.colors.qualitative.Set3)
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+
+def sleep_quality_bar(cube):
+    quality_counts = cube.count('Sleep Quality Category').sort_values(ascending=False)
+    fig = px.bar(x=quality_counts.index, y=quality_counts.values,
+                 title="Sleep Quality Distribution",
+                 color=quality_counts.values,
+                 color_continuous_scale='viridis')
+    fig.update_layout(xaxis_title="Sleep Quality", yaxis_title="Count")
+    return fig
+
+
+def sleep_duration_histogram(filtered_df, cube):
+    fig, note = render_budget.histogram(filtered_df, 'Sleep Duration', nbins=20,
+                                        title="Sleep Duration Distribution",
+                                        color_discrete_sequence=['#1f77b4'])
+    mean_sleep = cube.mean('Sleep Duration')
+    fig.add_vline(x=mean_sleep, line_dash="dash",
+                  annotation_text=f"Mean: {mean_sleep:.2f}h")
+    return fig, note
+
+
+# Occupation analysis
+
+def occupation_sleep_bar(cube):
+    occupation_sleep = pd.DataFrame({'Average Sleep': cube.mean('Sleep Duration', by='Occupation'),
+                                     'Count': cube.count('Occupation')}).reset_index()
+    occupation_sleep = occupation_sleep.sort_values('Average Sleep', ascending=True)
+    fig = px.bar(occupation_sleep, x='Average Sleep', y='Occupation',
+                 orientation='h', title="Average Sleep Duration by Occupation",
+                 color='Average Sleep', color_continuous_scale='viridis',
+                 hover_data=['Count'])
+    fig.update_layout(height=500)
+    return fig
+
+
+def occupation_quality_bar(cube):
+    quality_by_occ = cube.mean('Quality of Sleep', by='Occupation').sort_values(ascending=False)
+    return px.bar(x=quality_by_occ.values, y=quality_by_occ.index,
+                  orientation='h', title="Average Sleep Quality by Occupation",
+                  color=quality_by_occ.values, color_continuous_scale='plasma')
+
+
+def occupation_stress_bar(cube):
+    stress_by_occ = cube.mean('Stress Level', by='Occupation').sort_values(ascending=True)
+    return px.bar(x=stress_by_occ.values, y=stress_by_occ.index,
+                  orientation='h', title="Average Stress Level by Occupation",
+                  color=stress_by_occ.values, color_continuous_scale='reds')
+
+
+def occupation_disorder_bar(cube):
+    occ_disorder = cube.share('Occupation', 'Sleep Disorder Status')
+    fig = px.bar(occ_disorder, title="Sleep Disorder Percentage by Occupation",
+                 color_discrete_sequence=px.colors.qualitative.Set3)
+    fig.update_layout(yaxis_title="Percentage (%)", xaxis_title="Occupation")
+    return fig
+
+
+# Correlations
+
+def correlation_heatmap(correlation_matrix):
+    fig = px.imshow(correlation_matrix,
+                    title="Sleep Health Correlation Matrix",
+                    color_continuous_scale='RdBu_r',
+                    color_continuous_midpoint=0,
+                    text_auto='.2f')
+    fig.update_layout(height=600)
+    return fig
+
+
+def correlation_bar(correlation_matrix, column, title):
+    corrs = correlation_matrix[column].drop(column).sort_values(key=abs, ascending=False)
+    return px.bar(x=corrs.values, y=corrs.index,
+                  orientation='h', title=title,
+                  color=corrs.values, color_continuous_scale='RdBu_r',
+                  color_continuous_midpoint=0)
+
+
+def relationship_scatter(filtered_df, relationship):
+    return render_budget.scatter(filtered_df, **RELATIONSHIPS[relationship])
+
+
+def relationship_pairs():
+    """``(x, y)`` column pairs of the Key Relationships views"""
+    return [(spec['x'], spec['y']) for spec in RELATIONSHIPS.values()]
+
+
+def relationship_density(grid, x_axis, y_axis, relationship):
+    """Heatmap of a precomputed ``(nx, ny)`` count grid; returns ``(fig, note)``"""
+    spec = RELATIONSHIPS[relationship]
+    # Empty cells stay blank instead of taking the lowest color
+    counts = np.where(grid > 0, grid, np.nan).T
+    fig = go.Figure(go.Heatmap(x=x_axis.centers, y=y_axis.centers, z=counts,
+                               colorscale='Viridis', colorbar=dict(title="Participants"),
+                               hovertemplate=f"{spec['x']}: %{{x}}<br>{spec['y']}: %{{y}}"
+                                             "<br>Participants: %{z}<extra></extra>"))
+    fig.update_layout(title=f"{spec['title']} (density)", xaxis_title=spec['x'], yaxis_title=spec['y'])
+    note = f"{int(grid.sum()):,} rows in a {grid.shape[0]}×{grid.shape[1]} grid"
+    return fig, note
+
+
+# Demographics
+
+def age_metrics_bar(cube):
+    return px.bar(cube.mean(SLEEP_METRICS, by='Age Group'), title="Sleep Metrics by Age Group",
+                  barmode='group', color_discrete_sequence=px.colors.qualitative.Set2)
+
+
+def age_disorder_bar(cube):
+    return px.bar(cube.share('Age Group', 'Sleep Disorder Status'),
+                  title="Sleep Disorder Distribution by Age Group",
+                  color_discrete_sequence=px.colors.qualitative.Set3)
+
+
+def gender_sleep_bar(cube):
+    gender_sleep = cube.mean('Sleep Duration', by='Gender')
+    return px.bar(x=gender_sleep.index, y=gender_sleep.values,
+                  title="Average Sleep Duration by Gender",
+                  color=gender_sleep.values, color_continuous_scale='viridis')
+
+
+def gender_disorder_bar(cube):
+    return px.bar(cube.share('Gender', 'Sleep Disorder Status'), title="Sleep Disorder Rate by Gender",
+                  color_discrete_sequence=px.colors.qualitative.Pastel)
+
+
+def activity_metrics_bar(cube):
+    return px.bar(cube.mean(SLEEP_METRICS, by='Activity Level'), title="Sleep Metrics by Activity Level",
+                  barmode='group', color_discrete_sequence=px.colors.qualitative.Bold)
+
+
+# Individual explorer
+
+def custom_chart(filtered_df, cube, chart_type, x_axis, y_axis, color_by):
+    """Chart from the explorer's builder controls; returns ``(fig, note)``"""
+    if chart_type == 'Scatter Plot':
+        return render_budget.scatter(filtered_df, x=x_axis, y=y_axis, color=color_by,
+                                     hover_data=['Occupation', 'Age'], title=f"{x_axis} vs {y_axis}")
+    if chart_type == 'Box Plot':
+        return render_budget.box(filtered_df, x=color_by, y=x_axis, title=f"{x_axis} by {color_by}")
+    if chart_type == 'Histogram':
+        return render_budget.histogram(filtered_df, x_axis, color=color_by, title=f"{x_axis} Distribution")
+    # Bar Chart
+    grouped_data = cube.mean(x_axis, by=color_by).reset_index()
+    fig = px.bar(grouped_data, x=color_by, y=x_axis, title=f"Average {x_axis} by {color_by}")
+    return fig, None
+
+
+# Profiler
+
+def profile_flame(records):
+    """Flame-style timeline of one rerun's spans (from ``RerunProfile.records``)"""
+    spans = pd.DataFrame(records)
+    spans['level'] = spans['depth'].astype(str)
+    fig = px.bar(spans, x='duration_ms', y='level', base='start_ms', orientation='h',
+                 color='self_ms', color_continuous_scale='oranges', text='name',
+                 hover_data={'path': True, 'rows': True, 'duration_ms': ':.1f',
+                             'self_ms': ':.1f', 'level': False, 'start_ms': ':.1f'},
+                 title="Rerun Timeline")
+    fig.update_traces(textposition='inside', insidetextanchor='start')
+    fig.update_yaxes(autorange='reversed', title='Depth')
+    fig.update_layout(xaxis_title="Milliseconds", height=120 + 40 * spans['depth'].nunique(),
+                      coloraxis_colorbar_title="Self ms")
+    return fig
@@ -0,0 +1,132 @@
+"""Mergeable second-moment accumulators for the correlation matrix
+
+A :class:`MomentAccumulator` keeps the count, means and co-moment matrix of
+the numeric columns. Two accumulators over disjoint rows merge exactly
+(Chan et al.'s parallel update), so per-segment partials can be combined into
+the correlation matrix for any filter selection, and new batches of rows can
+be folded in without rescanning earlier ones.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS
+
+NUMERIC_COLUMNS = ('Age', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level',
+                   'Stress Level', 'Heart Rate', 'Daily Steps', 'Sleep Efficiency')
+
+
+class MomentAccumulator:
+    """Count, mean vector and co-moment matrix over a fixed set of columns
+
+    Rows with a missing value in any of the columns are skipped (listwise
+    deletion), which matches ``DataFrame.corr()`` on complete data.
+    """
+
+    def __init__(self, columns=NUMERIC_COLUMNS):
+        self.columns = tuple(columns)
+        k = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    @classmethod
+    def from_frame(cls, df, columns=NUMERIC_COLUMNS):
+        """Accumulate the rows of ``df``"""
+        acc = cls(columns)
+        acc.update(df)
+        return acc
+
+    def _combine(self, n, mean, comoment):
+        if n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.comoment = n, mean, comoment
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * (self.n * n / total)
+        self.mean = self.mean + delta * (n / total)
+        self.n = total
+
+    def update(self, batch):
+        """Fold a batch of rows (DataFrame with ``self.columns``) into the moments"""
+        values = batch[list(self.columns)].to_numpy(dtype='float64')
+        values = values[~np.isnan(values).any(axis=1)]
+        if len(values) == 0:
+            return self
+        mean = values.mean(axis=0)
+        centered = values - mean
+        self._combine(len(values), mean, centered.T @ centered)
+        return self
+
+    def merge(self, other):
+        """Return a new accumulator covering the rows of both"""
+        merged = MomentAccumulator(self.columns)
+        merged._combine(self.n, self.mean, self.comoment)
+        merged._combine(other.n, other.mean, other.comoment)
+        return merged
+
+    def covariance(self, ddof=1):
+        """Covariance matrix as a DataFrame"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = self.comoment / (self.n - ddof)
+        return pd.DataFrame(cov, index=list(self.columns), columns=list(self.columns))
+
+    def correlation(self):
+        """Pearson correlation matrix as a DataFrame"""
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.comoment / np.outer(scale, scale)
+        np.fill_diagonal(corr, np.where(scale > 0, 1.0, np.nan))
+        return pd.DataFrame(np.clip(corr, -1, 1), index=list(self.columns),
+                            columns=list(self.columns))
+
+
+class SegmentedMoments:
+    """One :class:`MomentAccumulator` per combination of the filter columns"""
+
+    def __init__(self, segment_columns=FILTER_COLUMNS, columns=NUMERIC_COLUMNS):
+        self.segment_columns = tuple(segment_columns)
+        self.columns = tuple(columns)
+        self.segments = {}
+
+    @classmethod
+    def from_frame(cls, df, segment_columns=FILTER_COLUMNS, columns=NUMERIC_COLUMNS):
+        """Build per-segment partials from the rows of ``df``"""
+        moments = cls(segment_columns, columns)
+        moments.add(df)
+        return moments
+
+    def copy(self):
+        """Copy that can be updated without changing this one"""
+        moments = SegmentedMoments(self.segment_columns, self.columns)
+        # Accumulators replace their arrays rather than mutating them, so a
+        # shallow copy of each is enough
+        moments.segments = {key: copy.copy(segment) for key, segment in self.segments.items()}
+        return moments
+
+    def add(self, batch):
+        """Fold a batch of new rows into the matching segments"""
+        groups = batch.groupby(list(self.segment_columns), observed=True,
+                               dropna=False, sort=False).indices
+        for key, positions in groups.items():
+            if len(self.segment_columns) == 1:
+                key = (key,)
+            segment = self.segments.get(key)
+            if segment is None:
+                segment = self.segments[key] = MomentAccumulator(self.columns)
+            segment.update(batch.iloc[positions])
+        return self
+
+    def where(self, selection):
+        """Merged accumulator for the segments matching ``{column: value or collection of values}``"""
+        wanted = [(self.segment_columns.index(col),
+                   set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value})
+                  for col, value in selection.items()]
+        combined = MomentAccumulator(self.columns)
+        for key, segment in self.segments.items():
+            if all(key[i] in values for i, values in wanted):
+                combined = combined.merge(segment)
+        return combined
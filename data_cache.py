@@ -0,0 +1,234 @@
+"""Persistent columnar cache for the preprocessed sleep health dataset
+
+The engineered DataFrame is written to an uncompressed Arrow IPC (Feather v2)
+file keyed by a hash of the source CSV and of the feature definitions. New
+server processes memory-map that file instead of re-parsing the CSV, and a
+changed CSV (or changed feature logic) produces a new key, so the cache
+rebuilds itself.
+
+Each cached file is one immutable dataset version. A small ``CURRENT``
+pointer file next to it names the version matching the CSV as of a given
+size and mtime, and is swapped with ``os.replace``, so other processes see
+either the old or the new version and never a partial one. Every process maps
+the same file, so the frame's pages live once in the OS page cache rather
+than once per process. A version's filter index may be saved next to it
+(see ``index_path``) and is removed together with it.
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+import features
+from features import engineer_features
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+CACHE_DIR = Path(os.environ.get('SLEEP_DASHBOARD_CACHE_DIR', '.cache'))
+
+# Bump when the on-disk layout changes so old files are ignored
+CACHE_FORMAT = 2
+
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_signature(path):
+    """Cheap change detector for ``path``: ``(size, mtime_ns)``, or None if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(payload, path):
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(payload))
+    os.replace(tmp_path, path)
+
+
+def source_digest(csv_path, cache_dir=CACHE_DIR):
+    """SHA-256 of the source CSV
+
+    The digest is remembered next to the cache together with the file's size
+    and mtime, so unchanged files are not re-hashed on every process start.
+    """
+    signature = file_signature(csv_path)
+    if signature is None:
+        raise FileNotFoundError(csv_path)
+
+    manifest_path = Path(cache_dir) / f'{Path(csv_path).stem}.digest.json'
+    try:
+        manifest = json.loads(manifest_path.read_text())
+        if (manifest['size'], manifest['mtime_ns']) == signature:
+            return manifest['sha256']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    sha256 = _hash_file(csv_path)
+    _write_json_atomic({'size': signature[0], 'mtime_ns': signature[1], 'sha256': sha256},
+                       manifest_path)
+    return sha256
+
+
+def features_digest():
+    """Hash of the feature definitions, so logic changes invalidate the cache"""
+    source = inspect.getsource(features).encode()
+    return hashlib.sha256(source).hexdigest()[:16]
+
+
+def cache_key(csv_path, cache_dir=CACHE_DIR):
+    """Key identifying one (source CSV, derivation logic, cache format) combination"""
+    return f'{source_digest(csv_path, cache_dir)[:16]}-{features_digest()}-v{CACHE_FORMAT}'
+
+
+def read_source(csv_path):
+    """Parse the raw CSV and add the engineered columns"""
+    df = pd.read_csv(csv_path)
+    return engineer_features(df)
+
+
+def _write_cache(df, cache_file):
+    tmp_file = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+    # Uncompressed so loads can memory-map the file, and a single record batch
+    # so columns need no concatenation (a private copy) when converted
+    table = pa.Table.from_pandas(df).combine_chunks()
+    feather.write_feather(table, tmp_file, compression='uncompressed', chunksize=max(len(df), 1))
+    os.replace(tmp_file, cache_file)
+
+
+def _map_cache(cache_file, version):
+    table = feather.read_table(cache_file, memory_map=True)
+    # split_blocks lets null-free numeric columns stay views on the mapping
+    df = table.to_pandas(split_blocks=True)
+    df.attrs['dataset_version'] = version
+    return df
+
+
+def _pointer_path(cache_dir, stem):
+    return Path(cache_dir) / f'{stem}.CURRENT.json'
+
+
+def current_version(csv_path, cache_dir=CACHE_DIR):
+    """The published version of ``csv_path``'s dataset, or None
+
+    Returns ``{'version', 'file', 'size', 'mtime_ns', 'features', 'format'}``,
+    where size and mtime are the CSV's at the time the version was published
+    and features and format are the ``features_digest`` and ``CACHE_FORMAT``
+    it was built with.
+    """
+    try:
+        return json.loads(_pointer_path(cache_dir, Path(csv_path).stem).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _remove_stale(cache_dir, stem, keep):
+    for path in cache_dir.glob(f'{stem}-*.arrow'):
+        if path != keep:
+            try:
+                path.unlink()
+            except OSError:
+                # Still mapped by another worker (Windows); retry on next rebuild
+                pass
+    for path in cache_dir.glob(f'{stem}-*.index'):
+        if path != keep.with_suffix('.index'):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def version_path(csv_path, version, cache_dir=CACHE_DIR):
+    """Cache file holding ``version`` of ``csv_path``'s dataset (which may not exist)"""
+    return Path(cache_dir) / f'{Path(csv_path).stem}-{version}.arrow'
+
+
+def index_path(csv_path, version, cache_dir=CACHE_DIR):
+    """Directory for the saved filter index of ``version`` (which may not exist)"""
+    return version_path(csv_path, version, cache_dir).with_suffix('.index')
+
+
+def publish(df, csv_path, version, signature, cache_dir=CACHE_DIR):
+    """Make ``df`` the current version of ``csv_path``'s dataset
+
+    ``signature`` is the CSV's ``file_signature`` that ``df`` reflects. The
+    version is written once (a process publishing an existing version
+    reuses the file) and the pointer is swapped to it. Returns the published
+    frame memory-mapped, so the caller can drop its own copy; without
+    pyarrow, ``df`` itself.
+    """
+    if not PYARROW_AVAILABLE:
+        df.attrs['dataset_version'] = version
+        return df
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(csv_path).stem
+    cache_file = version_path(csv_path, version, cache_dir)
+    if not cache_file.exists():
+        _write_cache(df, cache_file)
+    return _publish(cache_file, stem, version, signature, cache_dir)
+
+
+def _publish(cache_file, stem, version, signature, cache_dir):
+    # Map before older versions are unlinked; processes still mapping those
+    # keep reading them until they move on
+    df = _map_cache(cache_file, version)
+    _write_json_atomic({'version': version, 'file': cache_file.name,
+                        'size': signature[0], 'mtime_ns': signature[1],
+                        'features': features_digest(), 'format': CACHE_FORMAT},
+                       _pointer_path(cache_dir, stem))
+    _remove_stale(cache_dir, stem, keep=cache_file)
+    return df
+
+
+def load_preprocessed(csv_path, cache_dir=CACHE_DIR):
+    """Return the engineered dataset, rebuilding the columnar cache if it is stale
+
+    The returned frame carries its version in ``df.attrs['dataset_version']``.
+    If the published version matches the CSV's size and mtime and was built
+    by the current feature logic and cache format, it is mapped without
+    hashing the CSV. Without pyarrow the CSV is parsed directly and
+    nothing is cached.
+    """
+    if not PYARROW_AVAILABLE:
+        df = read_source(csv_path)
+        df.attrs['dataset_version'] = _hash_file(csv_path)[:16]
+        return df
+
+    signature = file_signature(csv_path)
+    if signature is None:
+        raise FileNotFoundError(csv_path)
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    current = current_version(csv_path, cache_dir)
+    if (current is not None
+            and (current.get('size'), current.get('mtime_ns')) == signature
+            and current.get('features') == features_digest()
+            and current.get('format') == CACHE_FORMAT):
+        try:
+            return _map_cache(cache_dir / current['file'], current['version'])
+        except FileNotFoundError:
+            # Replaced by a newer version since the pointer was read
+            pass
+
+    key = cache_key(csv_path, cache_dir)
+    stem = Path(csv_path).stem
+    cache_file = cache_dir / f'{stem}-{key}.arrow'
+    if not cache_file.exists():
+        _write_cache(read_source(csv_path), cache_file)
+    return _publish(cache_file, stem, key, signature, cache_dir)
@@ -0,0 +1,215 @@
+"""Precomputed 2-D density grids for the "Key Relationships" views
+
+Sleep Duration, Stress Level and the other relationship columns take only a
+few distinct values, so row-level scatters overplot. ``DensityGrids`` bins
+each relationship pair once at load into a count grid per filter segment,
+using bin edges shared by all segments. Grids add, so the density for any
+selection of segment values is a sum of a few small arrays, and new batches
+of rows are folded in without rebinning the old ones: a batch with values
+outside the current bins grows the axis (new equal-width bins beyond the
+edges, or a new bin per unseen value) and the existing counts move to their
+bins' new positions. An axis never exceeds ``MAX_BINS`` bins: past that a
+discrete axis becomes equal-width and an equal-width axis merges runs of
+neighbouring bins, folding their counts together.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS
+
+# Columns with at most this many distinct values get one bin per value;
+# others get this many equal-width bins
+MAX_BINS = 50
+
+
+class Axis:
+    """Bin edges for one column, with the bin centers used for display
+
+    A discrete axis has one bin per distinct value (its centers); other axes
+    have equal-width bins, each holding ``edges[i] <= value < edges[i + 1]``.
+    """
+
+    def __init__(self, column, edges, centers, discrete=False):
+        self.column = column
+        self.edges = edges
+        self.centers = centers
+        self.discrete = discrete
+
+    @classmethod
+    def from_values(cls, column, values, max_bins=MAX_BINS):
+        uniques = np.unique(values[~np.isnan(values)])
+        if len(uniques) <= max_bins:
+            return cls.per_value(column, uniques)
+        return cls.equal_width(column, uniques[0], uniques[-1], max_bins)
+
+    @classmethod
+    def equal_width(cls, column, low, high, n_bins):
+        """``n_bins`` equal-width bins covering ``low <= value <= high``"""
+        # Nudge the top edge up so ``high`` falls inside the last bin
+        edges = np.linspace(low, np.nextafter(high, np.inf), n_bins + 1)
+        return cls(column, edges, (edges[:-1] + edges[1:]) / 2)
+
+    @classmethod
+    def per_value(cls, column, uniques):
+        """Discrete axis over the sorted ``uniques``, with edges halfway between neighbours"""
+        if len(uniques) == 0:
+            return cls(column, np.array([]), uniques, discrete=True)
+        gaps = np.diff(uniques)
+        half = gaps.min() / 2 if len(gaps) else 0.5
+        middle = (uniques[:-1] + uniques[1:]) / 2
+        edges = np.concatenate([[uniques[0] - half], middle, [uniques[-1] + half]])
+        return cls(column, edges, uniques, discrete=True)
+
+    def extended(self, values):
+        """Axis whose bins also cover ``values``, and where the current bins moved
+
+        Returns ``(self, None)`` when every value already has its bin.
+        Otherwise returns the grown axis and, for each current bin, its
+        position on it; several bins share a position when they were merged
+        to stay within ``MAX_BINS``.
+        """
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self, None
+        if self.discrete:
+            unseen = np.setdiff1d(values, self.centers)
+            if len(unseen) == 0:
+                return self, None
+            uniques = np.union1d(self.centers, unseen)
+            if len(uniques) <= MAX_BINS:
+                grown = Axis.per_value(self.column, uniques)
+            else:
+                grown = Axis.equal_width(self.column, uniques[0], uniques[-1], MAX_BINS)
+            # Each current bin holds a single value, so it moves whole
+            return grown, grown.bins(self.centers)
+        width = self.edges[1] - self.edges[0]
+        below = max(int(np.ceil((self.edges[0] - values.min()) / width)), 0)
+        top = values.max()
+        above = int((top - self.edges[-1]) // width) + 1 if top >= self.edges[-1] else 0
+        if not below and not above:
+            return self, None
+        n_bins = below + len(self.centers) + above
+        # Merge runs of ``factor`` neighbouring bins; the merged edges are a
+        # subset of the fine ones, so every current bin nests in one new bin
+        factor = -(-n_bins // MAX_BINS)
+        above += -n_bins % factor
+        edges = np.concatenate([self.edges[0] - width * np.arange(below, 0, -1), self.edges,
+                                self.edges[-1] + width * np.arange(1, above + 1)])[::factor]
+        grown = Axis(self.column, edges, (edges[:-1] + edges[1:]) / 2)
+        return grown, (np.arange(len(self.centers)) + below) // factor
+
+    def bins(self, values):
+        """Bin number per value, -1 for NaN; values must be covered (see ``extended``)"""
+        if self.discrete:
+            bins = np.searchsorted(self.centers, values)
+        else:
+            bins = np.searchsorted(self.edges, values, side='right') - 1
+            # Guards against rounding at the outer edges
+            bins = np.clip(bins, 0, len(self.centers) - 1)
+        bins[np.isnan(values)] = -1
+        return bins
+
+
+class DensityGrids:
+    """Count grid per (relationship pair, segment) over shared bin edges"""
+
+    def __init__(self, pairs, axes, segment_columns=FILTER_COLUMNS):
+        self.pairs = tuple(pairs)
+        self.axes = axes
+        self.segment_columns = tuple(segment_columns)
+        self.keys = []
+        self._key_index = {}
+        self.grids = {pair: np.zeros((0, len(axes[pair[0]].centers), len(axes[pair[1]].centers)),
+                                     dtype=np.int64)
+                      for pair in self.pairs}
+
+    @classmethod
+    def from_frame(cls, df, pairs, segment_columns=FILTER_COLUMNS, axes=None):
+        """Bin ``df`` for each ``(x, y)`` pair; edges come from ``df`` unless ``axes`` is given"""
+        if axes is None:
+            columns = dict.fromkeys(column for pair in pairs for column in pair)
+            axes = {column: Axis.from_values(column, df[column].to_numpy(dtype='float64'))
+                    for column in columns}
+        grids = cls(pairs, axes, segment_columns)
+        grids.add(df)
+        return grids
+
+    def copy(self):
+        """Copy that can be updated without changing this one"""
+        grids = copy.copy(self)
+        grids.keys = list(self.keys)
+        grids._key_index = dict(self._key_index)
+        grids.grids = dict(self.grids)
+        return grids
+
+    def _segment_codes(self, batch):
+        if not self.segment_columns:
+            codes, uniques = np.zeros(len(batch), dtype=np.intp), [()]
+        else:
+            codes, uniques = pd.factorize(pd.MultiIndex.from_frame(batch[list(self.segment_columns)]))
+        # Map the batch's segments onto this object's segment numbering
+        mapping = np.empty(len(uniques), dtype=np.intp)
+        for i, key in enumerate(uniques):
+            key = tuple(key)
+            if key not in self._key_index:
+                self._key_index[key] = len(self.keys)
+                self.keys.append(key)
+            mapping[i] = self._key_index[key]
+        return mapping[codes]
+
+    def add(self, batch):
+        """Fold a batch of new rows into the grids
+
+        Grids are replaced rather than updated in place, so copies taken
+        before the call are unaffected.
+        """
+        segments = self._segment_codes(batch)
+        n_segments = len(self.keys)
+        moved = {}
+        axes = dict(self.axes)
+        for column in dict.fromkeys(column for pair in self.pairs for column in pair):
+            axes[column], positions = axes[column].extended(batch[column].to_numpy(dtype='float64'))
+            if positions is not None:
+                moved[column] = positions
+        if moved:
+            self._regrid(axes, moved)
+        for x, y in self.pairs:
+            x_axis, y_axis = self.axes[x], self.axes[y]
+            nx, ny = len(x_axis.centers), len(y_axis.centers)
+            x_bins = x_axis.bins(batch[x].to_numpy(dtype='float64'))
+            y_bins = y_axis.bins(batch[y].to_numpy(dtype='float64'))
+            valid = (x_bins >= 0) & (y_bins >= 0)
+            cells = (segments[valid] * nx + x_bins[valid]) * ny + y_bins[valid]
+            counts = np.bincount(cells, minlength=n_segments * nx * ny).reshape(n_segments, nx, ny)
+            old = self.grids[(x, y)]
+            if len(old) < n_segments:
+                old = np.concatenate([old, np.zeros((n_segments - len(old), nx, ny), dtype=np.int64)])
+            self.grids[(x, y)] = old + counts
+        return self
+
+    def _regrid(self, axes, moved):
+        """Move the counts onto grown axes; ``moved`` maps a column to its old bins' positions
+
+        Bins merged into one position have their counts summed.
+        """
+        for x, y in self.pairs:
+            if x not in moved and y not in moved:
+                continue
+            old = self.grids[(x, y)]
+            grid = np.zeros((len(old), len(axes[x].centers), len(axes[y].centers)), dtype=np.int64)
+            x_positions = moved.get(x, np.arange(old.shape[1]))
+            y_positions = moved.get(y, np.arange(old.shape[2]))
+            np.add.at(grid, (slice(None), x_positions[:, None], y_positions[None, :]), old)
+            self.grids[(x, y)] = grid
+        self.axes = axes
+
+    def where(self, pair, selection):
+        """Summed ``(nx, ny)`` grid of ``pair`` over segments matching ``{column: value(s)}``"""
+        wanted = [(self.segment_columns.index(col),
+                   set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value})
+                  for col, value in selection.items()]
+        mask = np.array([all(key[i] in values for i, values in wanted) for key in self.keys],
+                        dtype=bool)
+        return self.grids[pair][mask].sum(axis=0)
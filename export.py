@@ -0,0 +1,118 @@
+"""Chunked export of filtered rows as CSV, gzip-compressed CSV or Parquet
+
+Rows are encoded one chunk at a time by generators, so an export never holds
+the frame as a single CSV string; only the (optionally compressed) output
+accumulates. Parquet writes one row group per chunk and needs pyarrow.
+"""
+import io
+import zlib
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Format name -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def available_formats():
+    return [name for name in EXPORT_FORMATS if name != 'Parquet' or PYARROW_AVAILABLE]
+
+
+def _chunks(df, columns, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield start, df.iloc[start:start + chunk_rows][columns]
+
+
+def iter_csv(df, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield ``df[columns]`` as UTF-8 CSV bytes, one chunk of rows at a time"""
+    columns = list(columns if columns is not None else df.columns)
+    if len(df) == 0:
+        yield df[columns].to_csv(index=False).encode()
+        return
+    for start, chunk in _chunks(df, columns, chunk_rows):
+        yield chunk.to_csv(index=False, header=start == 0).encode()
+
+
+def iter_gzip(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def iter_parquet(df, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield ``df[columns]`` as a Parquet file, one row group per chunk of rows"""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("Parquet export needs pyarrow")
+    columns = list(columns if columns is not None else df.columns)
+    schema = pa.Schema.from_pandas(df[columns].iloc[:0], preserve_index=False)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for _, chunk in _chunks(df, columns, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_export(df, columns=None, export_format='CSV', chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Byte chunks of ``df[columns]`` encoded as ``export_format``"""
+    if export_format == 'CSV':
+        return iter_csv(df, columns, chunk_rows)
+    if export_format == 'CSV (gzip)':
+        return iter_gzip(iter_csv(df, columns, chunk_rows))
+    if export_format == 'Parquet':
+        return iter_parquet(df, columns, chunk_rows)
+    raise ValueError(f"Unknown export format {export_format!r}")
+
+
+def export_file(df, columns=None, export_format='CSV', chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Encoded export as a rewound in-memory binary file"""
+    out = io.BytesIO()
+    for chunk in iter_export(df, columns, export_format, chunk_rows):
+        out.write(chunk)
+    out.seek(0)
+    return out
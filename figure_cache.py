@@ -0,0 +1,98 @@
+"""Cross-session cache of serialized dashboard figures
+
+Figures are stored as Plotly JSON keyed by ``(chart id, filter key)``, where
+the filter key already carries the dataset version. The cache is shared by
+every session in the server process, bounded by a byte budget and evicts
+least recently used entries first.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+import profiler
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get('SLEEP_DASHBOARD_FIGURE_CACHE_MB', 256)) * 2**20)
+
+
+class FigureCache:
+    """Thread-safe LRU of ``key -> (figure JSON, note)`` with a memory cap"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(entry):
+        fig_json, note = entry
+        return len(fig_json) + len(note or '')
+
+    def get(self, key):
+        """Cached ``(figure JSON, note)`` for ``key``, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, fig_json, note=None):
+        entry = (fig_json, note)
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= self._size(old)
+            self._entries[key] = entry
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def get_or_build(self, key, build):
+        """Return ``(figure, note)``, building and caching it on a miss
+
+        ``build`` returns a figure or ``(figure, note)``. It runs outside the
+        lock, so concurrent misses for the same key may both build.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            fig_json, note = entry
+            with profiler.span('deserialize'):
+                return pio.from_json(fig_json, skip_invalid=True), note
+        with profiler.span('build'):
+            result = build()
+        fig, note = result if isinstance(result, tuple) else (result, None)
+        with profiler.span('serialize'):
+            fig_json = fig.to_json()
+        self.put(key, fig_json, note)
+        return fig, note
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
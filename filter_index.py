@@ -0,0 +1,463 @@
+"""Precomputed row index and query planner for the dashboard's sidebar filters
+
+Built once per dataset version, so a rerun resolves the selected filters with
+a memoized lookup instead of copying the full frame and re-scanning it with
+boolean masks.
+
+Categorical columns keep, for every value, the sorted row positions where it
+occurs plus a compact code per row. Range columns keep their distinct values
+with cumulative counts and the row order that sorts the column, so a range
+predicate is two binary searches and a slice. Both double as exact value
+histograms: the planner estimates each predicate's row count from them, lets
+the most selective predicate produce the candidate rows and checks the rest
+only against those candidates, most selective first.
+
+An index can be saved next to a published dataset version and memory-mapped
+by every server process (``FilterIndex.load``); ``SplitIndex`` answers
+lookups over such a shared index plus a small index of the rows appended
+since.
+"""
+import copy
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ALL = 'All'
+
+FILTER_COLUMNS = ('Age Group', 'Occupation', 'Sleep Disorder Status', 'BMI Category', 'Gender')
+
+RANGE_COLUMNS = ('Age', 'Daily Steps', 'Heart Rate', 'Stress Level')
+
+# Candidate sets larger than this share of the rows are built through a
+# boolean mask instead of by sorting positions
+DENSE_FRACTION = 1 / 16
+
+# Range predicates keep scanning whole columns while more than this share of
+# the rows survives; below it, checking only the survivors is cheaper
+SCAN_FRACTION = 1 / 4
+
+# Memory budget for memoized lookups; a single result bigger than
+# MEMO_ENTRY_FRACTION of it is recomputed rather than stored
+DEFAULT_CACHE_BYTES = 64 * 2**20
+MEMO_ENTRY_FRACTION = 1 / 8
+
+
+def _positions_dtype(n_rows):
+    """Smallest integer type for row positions; int32 halves the index up to 2**31 rows"""
+    return np.int32 if n_rows < 2**31 else np.int64
+
+
+def _positions_by_value(series, dtype=None):
+    """Map each distinct value of ``series`` to the sorted positions where it occurs"""
+    codes, uniques = pd.factorize(series)
+    # A stable sort keeps positions ascending inside each value's run
+    order = np.argsort(codes, kind='stable').astype(dtype or _positions_dtype(len(series)))
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    # Missing values (code -1) sort first; skip past them
+    start = len(codes) - counts.sum()
+    positions = {}
+    for value, count in zip(uniques, counts):
+        run = order[start:start + count]
+        run.flags.writeable = False
+        positions[value] = run
+        start += count
+    return positions
+
+
+def _codes_dtype(n_values):
+    return np.int8 if n_values < 2**7 else np.int16 if n_values < 2**15 else np.int32
+
+
+def _sorted_union(parts, n_rows):
+    """Sorted union of disjoint, individually sorted position arrays"""
+    if len(parts) == 1:
+        return parts[0]
+    if not parts:
+        return np.empty(0, dtype=_positions_dtype(n_rows))
+    if sum(len(part) for part in parts) > n_rows * DENSE_FRACTION:
+        mask = np.zeros(n_rows, dtype=bool)
+        for part in parts:
+            mask[part] = True
+        return np.flatnonzero(mask).astype(_positions_dtype(n_rows))
+    return np.sort(np.concatenate(parts))
+
+
+class _RowsMemo:
+    """Thread-safe LRU of ``predicates -> positions`` bounded by total bytes"""
+
+    def __init__(self, compute, max_bytes):
+        self.compute = compute
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+
+    @staticmethod
+    def _size(rows):
+        return 0 if rows is None else rows.nbytes
+
+    def __call__(self, predicates):
+        with self._lock:
+            rows = self._entries.get(predicates, self)
+            if rows is not self:
+                self._entries.move_to_end(predicates)
+                return rows
+        rows = self.compute(predicates)
+        size = self._size(rows)
+        if size > self.max_bytes * MEMO_ENTRY_FRACTION:
+            return rows
+        with self._lock:
+            old = self._entries.pop(predicates, None)
+            self.current_bytes += size - self._size(old)
+            self._entries[predicates] = rows
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self._size(evicted)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class _SortedColumn:
+    """Row order of a numeric column with its distinct values and cumulative counts"""
+
+    def __init__(self, values):
+        self.values = values
+        valid = np.flatnonzero(~pd.isna(values)).astype(_positions_dtype(len(values)))
+        self.order = valid[np.argsort(values[valid], kind='stable')]
+        self.uniques, counts = np.unique(values[self.order], return_counts=True)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def min(self):
+        return self.uniques[0] if len(self.uniques) else None
+
+    @property
+    def max(self):
+        return self.uniques[-1] if len(self.uniques) else None
+
+    def bounds(self, low, high):
+        """Slice of ``self.order`` holding the rows with ``low <= value <= high``"""
+        start = self.offsets[np.searchsorted(self.uniques, low, side='left')]
+        stop = self.offsets[np.searchsorted(self.uniques, high, side='right')]
+        return start, max(start, stop)
+
+    def count(self, low, high):
+        start, stop = self.bounds(low, high)
+        return stop - start
+
+    def positions(self, low, high):
+        start, stop = self.bounds(low, high)
+        return self.order[start:stop]
+
+    def extended(self, values):
+        """Copy covering the current rows plus ``values`` appended after them"""
+        grown = copy.copy(self)
+        grown.values = np.concatenate([self.values, values])
+        dtype = _positions_dtype(len(grown.values))
+        valid = np.flatnonzero(~pd.isna(values))
+        added = valid[np.argsort(values[valid], kind='stable')]
+        # Each new row goes after the existing rows with the same value
+        insert_at = self.offsets[np.searchsorted(self.uniques, values[added], side='right')]
+        grown.order = np.insert(self.order.astype(dtype, copy=False), insert_at,
+                                (added + len(self.values)).astype(dtype))
+        # Merge the batch's value counts into the existing ones instead of
+        # recounting every row
+        batch_uniques, batch_counts = np.unique(values[added], return_counts=True)
+        grown.uniques = np.union1d(self.uniques, batch_uniques)
+        counts = np.zeros(len(grown.uniques), dtype=np.int64)
+        counts[np.searchsorted(grown.uniques, self.uniques)] = np.diff(self.offsets)
+        counts[np.searchsorted(grown.uniques, batch_uniques)] += batch_counts
+        grown.offsets = np.concatenate([[0], np.cumsum(counts)])
+        return grown
+
+
+class _Lookups:
+    """Selection handling shared by the index classes
+
+    Subclasses provide ``columns``, ``range_columns``, ``value_range`` and
+    ``_lookup`` (predicates to positions).
+    """
+
+    def normalize(self, selection):
+        """Canonical, hashable form of ``selection`` without no-op predicates
+
+        ``selection`` maps a categorical column to one value or a collection
+        of values (``'All'`` or an empty collection leaves it unrestricted)
+        and a range column to an inclusive ``(low, high)`` pair.
+        """
+        predicates = []
+        for column, operand in selection.items():
+            if column in self.range_columns:
+                low, high = operand
+                minimum, maximum = self.value_range(column)
+                if minimum is not None and low <= minimum and high >= maximum:
+                    continue
+                predicates.append((column, (low, high)))
+            elif column in self.columns:
+                values = [operand] if isinstance(operand, str) else list(operand)
+                if not values or ALL in values:
+                    continue
+                predicates.append((column, frozenset(values)))
+            else:
+                raise KeyError(f"{column!r} is not an indexed filter column")
+        return tuple(sorted(predicates, key=lambda predicate: predicate[0]))
+
+    def rows(self, selection):
+        """Sorted row positions matching ``selection``, or None if nothing is filtered"""
+        return self._lookup(self.normalize(selection))
+
+
+class FilterIndex(_Lookups):
+    """Per-value row positions, sorted range columns and a memoized planner"""
+
+    def __init__(self, df, columns=FILTER_COLUMNS, range_columns=RANGE_COLUMNS,
+                 cache_bytes=DEFAULT_CACHE_BYTES):
+        self.columns = tuple(c for c in columns if c in df.columns)
+        self.range_columns = tuple(c for c in range_columns if c in df.columns)
+        self.n_rows = len(df)
+        self.positions = {col: _positions_by_value(df[col]) for col in self.columns}
+        self.codes = {}
+        for column in self.columns:
+            codes = np.full(self.n_rows, -1, dtype=_codes_dtype(len(self.positions[column])))
+            for code, run in enumerate(self.positions[column].values()):
+                codes[run] = code
+            self.codes[column] = codes
+        self.ranges = {col: _SortedColumn(df[col].to_numpy()) for col in self.range_columns}
+        self._lookup = _RowsMemo(self._compute_rows, cache_bytes)
+
+    def extended(self, batch):
+        """New index over the current rows plus ``batch`` appended after them
+
+        Only ``batch`` is factorized and sorted; each value's existing run is
+        reused and the batch's positions (offset by the current row count)
+        are appended or merged in.
+        """
+        grown = copy.copy(self)
+        grown.n_rows = self.n_rows + len(batch)
+        grown.positions = {}
+        grown.codes = {}
+        dtype = _positions_dtype(grown.n_rows)
+        for column in self.columns:
+            positions = dict(self.positions[column])
+            batch_positions = _positions_by_value(batch[column], dtype)
+            for value, run in batch_positions.items():
+                run = run + dtype(self.n_rows)
+                if value in positions:
+                    run = np.concatenate([positions[value].astype(dtype, copy=False), run])
+                run.flags.writeable = False
+                positions[value] = run
+            code_of = {value: code for code, value in enumerate(positions)}
+            codes = np.full(len(batch), -1, dtype=_codes_dtype(len(positions)))
+            for value, run in batch_positions.items():
+                codes[run] = code_of[value]
+            grown.positions[column] = positions
+            grown.codes[column] = np.concatenate([self.codes[column], codes])
+        grown.ranges = {col: self.ranges[col].extended(batch[col].to_numpy())
+                        for col in self.range_columns}
+        grown._lookup = _RowsMemo(grown._compute_rows, self._lookup.max_bytes)
+        return grown
+
+    def save(self, path):
+        """Write the index arrays under the directory ``path`` as ``.npy`` files
+
+        The directory is assembled under a temporary name and renamed into
+        place; if another process saved it first, its copy is kept.
+        """
+        path = Path(path)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        meta = {'n_rows': self.n_rows, 'columns': {}, 'range_columns': list(self.range_columns)}
+        for i, column in enumerate(self.columns):
+            runs = list(self.positions[column].values())
+            meta['columns'][column] = list(self.positions[column])
+            np.save(tmp_path / f'runs-{i}.npy',
+                    np.concatenate(runs) if runs else np.empty(0, _positions_dtype(self.n_rows)))
+            np.save(tmp_path / f'counts-{i}.npy', np.array([len(run) for run in runs], dtype=np.int64))
+            np.save(tmp_path / f'codes-{i}.npy', self.codes[column])
+        for i, column in enumerate(self.range_columns):
+            for attr in ('order', 'uniques', 'offsets'):
+                np.save(tmp_path / f'{attr}-{i}.npy', getattr(self.ranges[column], attr))
+        (tmp_path / 'meta.json').write_text(json.dumps(meta))
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Saved by another process meanwhile
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, df, cache_bytes=DEFAULT_CACHE_BYTES):
+        """Index of ``df`` saved by ``save``, with its arrays memory-mapped read-only
+
+        Every process loading the same directory shares the arrays' pages.
+        Raises FileNotFoundError if nothing was saved at ``path``.
+        """
+        path = Path(path)
+        meta = json.loads((path / 'meta.json').read_text())
+        if meta['n_rows'] != len(df):
+            raise ValueError(f"index at {path} covers {meta['n_rows']} rows, not {len(df)}")
+        index = cls.__new__(cls)
+        index.columns = tuple(meta['columns'])
+        index.range_columns = tuple(meta['range_columns'])
+        index.n_rows = len(df)
+        index.positions = {}
+        index.codes = {}
+        for i, (column, values) in enumerate(meta['columns'].items()):
+            runs = np.load(path / f'runs-{i}.npy', mmap_mode='r')
+            offsets = np.concatenate([[0], np.cumsum(np.load(path / f'counts-{i}.npy'))])
+            index.positions[column] = {value: runs[start:stop]
+                                       for value, start, stop in zip(values, offsets[:-1], offsets[1:])}
+            index.codes[column] = np.load(path / f'codes-{i}.npy', mmap_mode='r')
+        index.ranges = {}
+        for i, column in enumerate(index.range_columns):
+            sorted_column = _SortedColumn.__new__(_SortedColumn)
+            sorted_column.values = df[column].to_numpy()
+            for attr in ('order', 'uniques', 'offsets'):
+                setattr(sorted_column, attr, np.load(path / f'{attr}-{i}.npy', mmap_mode='r'))
+            index.ranges[column] = sorted_column
+        index._lookup = _RowsMemo(index._compute_rows, cache_bytes)
+        return index
+
+    def values(self, column):
+        """Distinct values of ``column`` in order of first appearance"""
+        return list(self.positions[column])
+
+    def value_range(self, column):
+        """``(min, max)`` of a range column"""
+        return self.ranges[column].min, self.ranges[column].max
+
+    def clear_cache(self):
+        """Forget memoized lookups (after the positions change)"""
+        self._lookup.clear()
+
+    def plan(self, selection):
+        """``(column, operand, estimated rows)`` per predicate, most selective first"""
+        steps = []
+        for column, operand in self.normalize(selection):
+            if column in self.ranges:
+                estimate = self.ranges[column].count(*operand)
+            else:
+                runs = self.positions[column]
+                estimate = sum(len(runs[value]) for value in operand if value in runs)
+            steps.append((column, operand, int(estimate)))
+        return sorted(steps, key=lambda step: step[2])
+
+    def _candidates(self, steps):
+        """Sorted positions matching the first predicate(s); returns the unused steps"""
+        column, operand, estimate = steps[0]
+        if column not in self.ranges:
+            runs = self.positions[column]
+            return _sorted_union([runs[v] for v in operand if v in runs], self.n_rows), steps[1:]
+        fraction = estimate / self.n_rows
+        if fraction <= DENSE_FRACTION:
+            return np.sort(self.ranges[column].positions(*operand)), steps[1:]
+        # Sorting a large slice of the row order costs more than scanning the
+        # column; keep scanning while following range predicates stay broad
+        mask = self._matches(column, operand)
+        steps = steps[1:]
+        while steps and steps[0][0] in self.ranges and fraction > SCAN_FRACTION:
+            column, operand, estimate = steps.pop(0)
+            mask &= self._matches(column, operand)
+            fraction *= estimate / self.n_rows
+        return np.flatnonzero(mask).astype(_positions_dtype(self.n_rows)), steps
+
+    def _matches(self, column, operand, positions=slice(None)):
+        """Boolean mask of the rows at ``positions`` (default: all) matching one predicate"""
+        if column in self.ranges:
+            values = self.ranges[column].values[positions]
+            low, high = operand
+            return (values >= low) & (values <= high)
+        runs = self.positions[column]
+        # One extra slot so missing values (code -1) look up False
+        wanted = np.zeros(len(runs) + 1, dtype=bool)
+        for code, value in enumerate(runs):
+            wanted[code] = value in operand
+        return wanted[self.codes[column][positions]]
+
+    def _compute_rows(self, predicates):
+        if not predicates:
+            return None
+        steps = self.plan(dict(predicates))
+        if not steps:
+            # Every predicate spans this index's whole range, as can happen
+            # for one part of a SplitIndex
+            result = np.arange(self.n_rows, dtype=_positions_dtype(self.n_rows))
+            result.flags.writeable = False
+            return result
+        # The most selective predicate yields the candidates; the others are
+        # only checked at the surviving positions
+        result, steps = self._candidates(steps)
+        for column, operand, _ in steps:
+            if len(result) == 0:
+                break
+            result = result[self._matches(column, operand, result)]
+        result.flags.writeable = False
+        return result
+
+
+class SplitIndex(_Lookups):
+    """Index over a base frame's rows followed by a tail of appended rows
+
+    ``base`` is typically loaded shared (see ``FilterIndex.load``) and
+    ``tail`` covers the few rows appended since, so appending never copies
+    the base's arrays. Positions count base rows first.
+    """
+
+    def __init__(self, base, tail):
+        self.base = base
+        self.tail = tail
+        self.columns = base.columns
+        self.range_columns = base.range_columns
+        self.n_rows = base.n_rows + tail.n_rows
+        # Base lookups are memoized by the base index, which outlives this
+        # one; the tail is small enough to resolve on every call
+        self._lookup = self._compute_rows
+
+    def extended(self, batch):
+        """New index with ``batch`` appended to the tail"""
+        return SplitIndex(self.base, self.tail.extended(batch))
+
+    def values(self, column):
+        """Distinct values of ``column`` in order of first appearance"""
+        return list(dict.fromkeys(self.base.values(column) + self.tail.values(column)))
+
+    def value_range(self, column):
+        """``(min, max)`` of a range column"""
+        minimums, maximums = zip(self.base.value_range(column), self.tail.value_range(column))
+        return (min((value for value in minimums if value is not None), default=None),
+                max((value for value in maximums if value is not None), default=None))
+
+    def clear_cache(self):
+        """Forget memoized lookups"""
+        self.base.clear_cache()
+
+    def _compute_rows(self, predicates):
+        if not predicates:
+            return None
+        dtype = _positions_dtype(self.n_rows)
+        result = np.concatenate([self.base._lookup(predicates).astype(dtype, copy=False),
+                                 self.tail._compute_rows(predicates) + dtype(self.base.n_rows)])
+        result.flags.writeable = False
+        return result
+
+
+def apply_filters(df, index, selection):
+    """Return the rows of ``df`` matching ``selection``
+
+    Unfiltered selections return ``df`` itself; otherwise only the matching
+    rows are gathered.
+    """
+    positions = index.rows(selection)
+    if positions is None:
+        return df
+    return df.take(positions)
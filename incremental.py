@@ -0,0 +1,272 @@
+"""Append-only incremental refresh of the dashboard dataset
+
+The survey CSV grows by appending rows with new Person IDs. ``LiveDataset``
+remembers the byte offset it has consumed plus a digest of the bytes just
+before it; when the file grows and that tail is unchanged, only the new bytes
+are parsed and engineered, and the filter index, aggregate cube and
+correlation partials are extended with the delta instead of being rebuilt.
+Rows whose Person ID is not above the watermark are dropped, so a row read
+twice (e.g. appended while the initial load was running) is not counted
+twice. Only complete lines are consumed: a row still being written is left
+for a later refresh, so appenders should end each row with a newline (a row
+written after a leading newline instead becomes visible once the next row
+starts). Rows that do not fit the dataset's columns, such as text in a
+numeric column, are skipped and counted in ``rows_rejected``. Any other
+change to the file falls back to a full reload.
+
+Each refresh publishes a new immutable ``DatasetSnapshot``, so sessions
+holding the previous snapshot keep a consistent view. A snapshot pairs the
+published frame, memory-mapped and shared by every server process, with a
+small private ``tail`` of the rows appended since; its filter index likewise
+pairs the published version's saved, memory-mapped index with an index of
+the tail (see ``filter_index.SplitIndex``). Once the tail reaches
+``PUBLISH_FRACTION`` of the published rows, both are written to the columnar
+cache as version ``<base>+<rows appended>`` and mapped back (see
+``data_cache.publish``), and the tail starts empty again. Rewriting the frame
+only every so many rows keeps the cost of an append proportional to the delta
+on average. A process that reaches a version another one has already
+published maps that version and its index instead.
+"""
+import hashlib
+import io
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AggregateCube
+from correlation import SegmentedMoments
+from data_cache import (CACHE_DIR, PYARROW_AVAILABLE, file_signature, index_path, load_preprocessed,
+                        publish, version_path)
+from density import DensityGrids
+from features import engineer_features
+from filter_index import FilterIndex, SplitIndex
+
+WATERMARK_COLUMN = 'Person ID'
+
+# Bytes before the consumed offset that must be unchanged for an append
+TAIL_BYTES = 4096
+
+# Unpublished appended rows, as a share of the published frame, that trigger
+# writing a new shared version
+PUBLISH_FRACTION = 1 / 8
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """The dataset and the structures derived from it, at one version
+
+    ``base`` is the published frame and ``tail`` the rows appended since,
+    labelled and positioned after the base's rows. ``index`` covers both (a
+    ``SplitIndex`` while the tail has rows).
+    """
+    base: pd.DataFrame
+    tail: pd.DataFrame
+    index: FilterIndex
+    cube: AggregateCube
+    moments: SegmentedMoments
+    density: DensityGrids
+    version: str
+
+    @property
+    def n_rows(self):
+        return len(self.base) + len(self.tail)
+
+    def frame(self):
+        """Every row as one frame; a transient copy while the tail has rows"""
+        if self.tail.empty:
+            return self.base
+        return pd.concat([self.base, self.tail])
+
+    def take(self, positions):
+        """Rows at the sorted ``positions``, gathering only those rows"""
+        split = np.searchsorted(positions, len(self.base))
+        if split == len(positions):
+            return self.base.take(positions)
+        tail = self.tail.take(positions[split:] - len(self.base))
+        return pd.concat([self.base.take(positions[:split]), tail]) if split else tail
+
+    def select(self, selection):
+        """Rows matching the filter ``selection`` (see ``FilterIndex.normalize``)"""
+        positions = self.index.rows(selection)
+        return self.frame() if positions is None else self.take(positions)
+
+
+def _tail_digest(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(max(offset - TAIL_BYTES, 0))
+        return hashlib.sha256(f.read(offset - f.tell())).hexdigest()
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        return f.readline()
+
+
+class LiveDataset:
+    """Dataset that follows appends to its source CSV"""
+
+    def __init__(self, csv_path, cache_dir=CACHE_DIR, density_pairs=()):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self.density_pairs = tuple(density_pairs)
+        self.full_reloads = 0
+        self.rows_rejected = 0
+        self._lock = threading.Lock()
+        self._reload()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def _reload(self):
+        # Take the offset before loading: rows appended during the load are
+        # re-read by the next refresh and dropped by the watermark
+        signature = file_signature(self.csv_path)
+        if signature is None:
+            raise FileNotFoundError(self.csv_path)
+        df = load_preprocessed(self.csv_path, self.cache_dir)
+        self._header = _read_header(self.csv_path)
+        self._signature = signature
+        self._offset = signature[0]
+        self._tail = _tail_digest(self.csv_path, self._offset)
+        version = df.attrs.get('dataset_version')
+        # A published appended version continues its row count
+        self._base_version, _, appended = version.partition('+')
+        self.rows_appended = int(appended or 0)
+        self._watermark = (df[WATERMARK_COLUMN].max()
+                           if WATERMARK_COLUMN in df.columns and len(df) else None)
+        self._snapshot = DatasetSnapshot(
+            base=df, tail=df.iloc[:0], index=self._shared_index(df, version, FilterIndex),
+            cube=AggregateCube.from_frame(df), moments=SegmentedMoments.from_frame(df),
+            density=DensityGrids.from_frame(df, self.density_pairs), version=version)
+        self.full_reloads += 1
+
+    def _shared_index(self, df, version, build):
+        """Filter index of the published ``df``, memory-mapped from beside its cache file
+
+        The first process to need it saves ``build(df)`` there.
+        """
+        if not PYARROW_AVAILABLE:
+            # Nothing is published on disk
+            return build(df)
+        path = index_path(self.csv_path, version, self.cache_dir)
+        try:
+            return FilterIndex.load(path, df)
+        except (FileNotFoundError, ValueError):
+            pass
+        index = build(df)
+        index.save(path)
+        try:
+            return FilterIndex.load(path, df)
+        except (FileNotFoundError, ValueError):
+            # Removed by a newer version meanwhile; keep the private copy
+            return index
+
+    def refresh(self):
+        """Bring the snapshot up to date with the CSV and return it
+
+        Costs one ``stat`` when the file is unchanged. When it only grew,
+        parsing and aggregation are proportional to the new rows; publishing
+        writes the grown frame once.
+        """
+        signature = file_signature(self.csv_path)
+        if signature is None:
+            raise FileNotFoundError(self.csv_path)
+        if signature == self._signature:
+            return self._snapshot
+        with self._lock:
+            signature = file_signature(self.csv_path)
+            if signature is None:
+                raise FileNotFoundError(self.csv_path)
+            if signature == self._signature:
+                return self._snapshot
+            if (signature[0] < self._offset
+                    or _read_header(self.csv_path) != self._header
+                    or _tail_digest(self.csv_path, self._offset) != self._tail):
+                # Rewritten rather than appended to
+                self._reload()
+                return self._snapshot
+            self._append(signature)
+            return self._snapshot
+
+    def _read_delta(self, end):
+        """Rows in the complete lines after the offset, as strings, and the bytes they span"""
+        with open(self.csv_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(end - self._offset)
+        # Stop after the last newline; whatever follows may be half written
+        data = data[:data.rfind(b'\n') + 1]
+        if not data.strip():
+            return None, len(data)
+        # The delta has no header, and may start with the newline that
+        # terminates the previous last row (when the file had none at its end)
+        delta = pd.read_csv(io.BytesIO(self._header + data), dtype=str, skip_blank_lines=True,
+                            on_bad_lines='skip')
+        return delta, len(data)
+
+    def _coerce(self, delta, dtypes):
+        """Cast the delta's columns to ``dtypes``, dropping rows whose values don't fit"""
+        keep = np.ones(len(delta), dtype=bool)
+        columns = {}
+        for column in delta.columns:
+            if column not in dtypes:
+                continue
+            dtype = dtypes[column]
+            if pd.api.types.is_numeric_dtype(dtype):
+                values = pd.to_numeric(delta[column], errors='coerce')
+                # Text that is not a number, and missing values in integer columns
+                keep &= ~(values.isna() & delta[column].notna()).to_numpy()
+                if pd.api.types.is_integer_dtype(dtype):
+                    keep &= (values.notna() & (values % 1 == 0)).to_numpy()
+                columns[column] = values
+            else:
+                columns[column] = delta[column]
+        delta = delta.assign(**columns)[keep]
+        self.rows_rejected += int((~keep).sum())
+        return delta.astype({col: dtypes[col] for col in delta.columns if col in dtypes})
+
+    def _append(self, signature):
+        old = self._snapshot
+        delta, consumed = self._read_delta(signature[0])
+        if delta is not None:
+            # Match the cached frame's dtypes before deriving features, so
+            # e.g. an all-missing 'Sleep Disorder' batch stays a string column
+            delta = self._coerce(delta, old.base.dtypes.to_dict())
+            if WATERMARK_COLUMN in delta.columns and self._watermark is not None:
+                delta = delta[delta[WATERMARK_COLUMN] > self._watermark]
+
+        if delta is not None and len(delta):
+            delta = engineer_features(delta.reset_index(drop=True))
+            delta = delta[old.base.columns].astype(old.base.dtypes.to_dict())
+            self.rows_appended += len(delta)
+            if WATERMARK_COLUMN in delta.columns:
+                self._watermark = max(self._watermark or 0, delta[WATERMARK_COLUMN].max())
+            version = f'{self._base_version}+{self.rows_appended}'
+            # Feature engineering, indexing and aggregation only touch the
+            # delta; the base frame and its index are not copied
+            base = old.base
+            tail = pd.concat([old.tail, delta], ignore_index=True)
+            tail.index = pd.RangeIndex(len(base), len(base) + len(tail))
+            if old.tail.empty:
+                index = SplitIndex(old.index, FilterIndex(delta))
+            else:
+                index = old.index.extended(delta)
+            if (len(tail) >= len(base) * PUBLISH_FRACTION
+                    or version_path(self.csv_path, version, self.cache_dir).exists()):
+                split_index, unpublished = index, tail
+                base = publish(pd.concat([base, tail], ignore_index=True), self.csv_path, version,
+                               signature, self.cache_dir)
+                tail = base.iloc[:0]
+                index = self._shared_index(base, version,
+                                           lambda df: split_index.base.extended(unpublished))
+            self._snapshot = DatasetSnapshot(
+                base=base, tail=tail, index=index,
+                cube=AggregateCube(old.cube.cells, old.cube.dimensions, old.cube.metrics).add(delta),
+                moments=old.moments.copy().add(delta), density=old.density.copy().add(delta),
+                version=version)
+
+        self._offset += consumed
+        self._tail = _tail_digest(self.csv_path, self._offset)
+        self._signature = signature
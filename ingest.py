@@ -0,0 +1,155 @@
+"""Chunked (out-of-core) ingestion of the sleep health CSV
+
+Reads the CSV in fixed-size chunks with compact dtypes, applies the feature
+engineering per chunk and feeds each chunk to the aggregate and correlation
+consumers, so no more than one chunk of rows is held in memory at a time.
+This is a standalone summary and reporting tool: the summaries are printed,
+not persisted, and the dashboard builds its own from the cached dataset.
+
+Usage:
+    python ingest.py Sleep_health_and_lifestyle_dataset.csv --chunksize 100000
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+
+from aggregates import AggregateCube
+from correlation import SegmentedMoments
+from features import engineer_features
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Compact dtypes for the raw columns; Blood Pressure is split separately.
+# The integer types are nullable so an empty cell is missing, not an error
+RAW_DTYPES = {
+    'Person ID': 'UInt32',
+    'Gender': 'category',
+    'Age': 'UInt8',
+    'Occupation': 'category',
+    'Sleep Duration': 'float32',
+    'Quality of Sleep': 'UInt8',
+    'Physical Activity Level': 'UInt8',
+    'Stress Level': 'UInt8',
+    'BMI Category': 'category',
+    'Blood Pressure': 'category',
+    'Heart Rate': 'UInt8',
+    'Daily Steps': 'UInt16',
+    'Sleep Disorder': 'category',
+}
+
+
+@dataclass
+class IngestReport:
+    """Summary of one chunked ingestion run"""
+    rows: int
+    chunks: int
+    chunksize: int
+    seconds: float
+    peak_rss_bytes: int
+    peak_traced_bytes: int
+    max_chunk_bytes: int
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def split_blood_pressure(chunk):
+    """Replace 'Blood Pressure' ("126/83") with systolic/diastolic integer columns
+
+    Only the distinct readings (the categories) are parsed; rows are mapped
+    through their category codes. Missing or unparsable readings become
+    missing values.
+    """
+    bp = chunk['Blood Pressure'].cat
+    parts = pd.Series(bp.categories).str.partition('/')
+    codes = bp.codes.to_numpy()
+    missing = codes == -1
+    for column, part, dtype in (('Systolic BP', parts[0], 'UInt16'), ('Diastolic BP', parts[2], 'UInt8')):
+        values = pd.to_numeric(part, errors='coerce').astype(dtype).array
+        # Code -1 (missing) would otherwise index the last category
+        column_values = values.take(codes, allow_fill=True)
+        column_values[missing] = pd.NA
+        chunk[column] = column_values
+    return chunk.drop(columns='Blood Pressure')
+
+
+def iter_chunks(csv_path, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield engineered chunks of at most ``chunksize`` rows"""
+    reader = pd.read_csv(csv_path, dtype=RAW_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        yield engineer_features(split_blood_pressure(chunk))
+
+
+def ingest(csv_path, consumers, chunksize=DEFAULT_CHUNKSIZE, trace_memory=False):
+    """Stream ``csv_path`` through ``consumers`` (objects with an ``add(chunk)`` method)
+
+    Returns an :class:`IngestReport`. With ``trace_memory`` the peak traced
+    allocation of the run is recorded too; it scales with ``chunksize``
+    rather than with the file size, but tracing slows ingestion down
+    several times, so it is off by default.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    rows = chunks = max_chunk_bytes = 0
+    peak_traced = None
+    try:
+        for chunk in iter_chunks(csv_path, chunksize):
+            for consumer in consumers:
+                consumer.add(chunk)
+            rows += len(chunk)
+            chunks += 1
+            max_chunk_bytes = max(max_chunk_bytes, int(chunk.memory_usage(deep=True).sum()))
+        if trace_memory:
+            _, peak_traced = tracemalloc.get_traced_memory()
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return IngestReport(rows=rows, chunks=chunks, chunksize=chunksize,
+                        seconds=time.perf_counter() - start, peak_rss_bytes=peak_rss_bytes(),
+                        peak_traced_bytes=peak_traced, max_chunk_bytes=max_chunk_bytes)
+
+
+def ingest_summaries(csv_path, chunksize=DEFAULT_CHUNKSIZE, trace_memory=False):
+    """Build the aggregate cube and correlation partials without materializing all rows"""
+    cube = AggregateCube()
+    moments = SegmentedMoments()
+    report = ingest(csv_path, [cube, moments], chunksize, trace_memory)
+    return cube, moments, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv_path')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help='rows per chunk; bounds peak memory (default: %(default)s)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record peak traced allocations (slower)')
+    args = parser.parse_args(argv)
+
+    cube, moments, report = ingest_summaries(args.csv_path, args.chunksize, args.trace_memory)
+    print(json.dumps(asdict(report)))
+    print(f"Participants: {int(cube.count())}  "
+          f"cube cells: {len(cube.cells)}  segments: {len(moments.segments)}")
+    if report.peak_rss_bytes is not None:
+        print(f"Peak RSS: {report.peak_rss_bytes / 2**20:.1f} MiB")
+    if report.peak_traced_bytes is not None:
+        print(f"Peak traced allocations: {report.peak_traced_bytes / 2**20:.1f} MiB")
+    print(f"Largest chunk: {report.max_chunk_bytes / 2**20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Opt-in timing traces for dashboard reruns
+
+A ``RerunProfile`` records nested spans (name, start, duration, row count)
+for one script run. Spans are only recorded while profiling is enabled; when
+it is off ``span()`` hands back a shared no-op context manager, so the
+instrumented code pays for little more than a function call.
+
+The active profile is held in a context variable, so helpers deep inside a
+tab can open spans without the profile being passed through every call.
+"""
+import contextvars
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+PROFILE_ENV = 'SLEEP_DASHBOARD_PROFILE'
+TRACE_FILE_ENV = 'SLEEP_DASHBOARD_TRACE_FILE'
+
+
+class _NullSpan:
+    """Stand-in yielded when profiling is off; ignores everything"""
+
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return None
+
+    @rows.setter
+    def rows(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed region; ``rows`` may be set while it is open"""
+
+    __slots__ = ('name', 'rows', 'start', 'seconds', 'children', '_profile')
+
+    def __init__(self, profile, name, rows=None):
+        self._profile = profile
+        self.name = name
+        self.rows = rows
+        self.start = None
+        self.seconds = None
+        self.children = []
+
+    def __enter__(self):
+        profile = self._profile
+        profile._stack[-1].children.append(self)
+        profile._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self._profile._stack.pop()
+        return False
+
+
+class RerunProfile:
+    """Span tree for a single rerun"""
+
+    def __init__(self, enabled=False, label='rerun'):
+        self.enabled = enabled
+        self.rerun_id = uuid.uuid4().hex[:12]
+        self.timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.root = Span(self, label)
+        self.root.start = time.perf_counter()
+        self._stack = [self.root]
+
+    def span(self, name, rows=None):
+        """Context manager timing ``name``; a no-op when profiling is off"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, rows)
+
+    def finish(self):
+        if self.root.seconds is None:
+            self.root.seconds = time.perf_counter() - self.root.start
+        return self
+
+    def records(self):
+        """Flat depth-first list of spans with start offsets and self time in ms"""
+        self.finish()
+        origin = self.root.start
+        records = []
+
+        def walk(span, path, depth):
+            path = f'{path}/{span.name}' if path else span.name
+            seconds = span.seconds if span.seconds is not None else 0.0
+            child_seconds = sum(c.seconds or 0.0 for c in span.children)
+            records.append({
+                'rerun': self.rerun_id,
+                'timestamp': self.timestamp,
+                'name': span.name,
+                'path': path,
+                'depth': depth,
+                'start_ms': (span.start - origin) * 1e3,
+                'duration_ms': seconds * 1e3,
+                'self_ms': max(seconds - child_seconds, 0.0) * 1e3,
+                'rows': span.rows,
+            })
+            for child in span.children:
+                walk(child, path, depth + 1)
+
+        walk(self.root, '', 0)
+        return records
+
+    def to_jsonl(self):
+        return ''.join(json.dumps(r) + '\n' for r in self.records())
+
+    def export(self, path):
+        """Append this rerun's spans to ``path`` as JSON lines"""
+        with open(path, 'a') as f:
+            f.write(self.to_jsonl())
+
+
+_DISABLED = RerunProfile(enabled=False)
+_current = contextvars.ContextVar('rerun_profile', default=_DISABLED)
+
+
+def env_enabled():
+    return os.environ.get(PROFILE_ENV) == '1'
+
+
+def start(enabled, label='rerun'):
+    """Begin a rerun profile and make it the active one"""
+    profile = RerunProfile(enabled, label) if enabled else _DISABLED
+    _current.set(profile)
+    return profile
+
+
+def current():
+    return _current.get()
+
+
+def span(name, rows=None):
+    """Open a span on the active profile"""
+    return _current.get().span(name, rows)
@@ -0,0 +1,118 @@
+"""Render budget for row-level charts
+
+Scatter plots are stratified-sampled per color group down to a point budget
+(switching to WebGL traces above a threshold), and histograms and box plots
+are pre-aggregated with numpy/pandas, so the browser receives a bounded
+amount of data whatever the size of the filtered frame. Each helper returns
+the figure plus a short note describing what was actually drawn.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+MAX_SCATTER_POINTS = int(os.environ.get('SLEEP_DASHBOARD_MAX_POINTS', 5000))
+WEBGL_THRESHOLD = 1000
+DEFAULT_BINS = 30
+SAMPLE_SEED = 0
+
+
+def points_note(drawn, total):
+    if drawn == total:
+        return f"Showing all {total:,} points"
+    return f"Showing {drawn:,} of {total:,} points (stratified sample)"
+
+
+def stratified_sample(df, by=None, budget=MAX_SCATTER_POINTS, seed=SAMPLE_SEED):
+    """Uniform sample of at most about ``budget`` rows, allocated per ``by`` group
+
+    Each group keeps a share of the budget proportional to its size (at least
+    one row), so small groups stay visible and within-group density is
+    preserved. The seed is fixed so reruns draw the same points.
+    """
+    if len(df) <= budget:
+        return df
+    rng = np.random.default_rng(seed)
+    if by is None:
+        groups = {None: np.arange(len(df))}
+    else:
+        groups = df.groupby(by, observed=True, sort=False).indices
+    picks = []
+    for positions in groups.values():
+        quota = min(len(positions), max(1, round(budget * len(positions) / len(df))))
+        picks.append(rng.choice(positions, size=quota, replace=False))
+    return df.take(np.sort(np.concatenate(picks)))
+
+
+def scatter(df, x, y, color=None, budget=MAX_SCATTER_POINTS, **kwargs):
+    """``px.scatter`` over a stratified sample of ``df``; returns ``(fig, note)``"""
+    sample = stratified_sample(df, color, budget)
+    render_mode = 'webgl' if len(sample) > WEBGL_THRESHOLD else 'auto'
+    fig = px.scatter(sample, x=x, y=y, color=color, render_mode=render_mode, **kwargs)
+    return fig, points_note(len(sample), len(df))
+
+
+def histogram(df, x, color=None, nbins=DEFAULT_BINS, title=None, **kwargs):
+    """Histogram pre-binned with ``np.histogram``; returns ``(fig, note)``
+
+    Bins are shared across color groups and stacked like ``px.histogram``.
+    """
+    values = df[x].to_numpy(dtype='float64')
+    finite = values[np.isfinite(values)]
+    edges = np.histogram_bin_edges(finite, bins=nbins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    if color is None:
+        counts, _ = np.histogram(finite, bins=edges)
+        binned = pd.DataFrame({x: centers, 'count': counts})
+    else:
+        frames = []
+        for group, positions in df.groupby(color, observed=True, sort=True).indices.items():
+            group_values = values[positions]
+            counts, _ = np.histogram(group_values[np.isfinite(group_values)], bins=edges)
+            frames.append(pd.DataFrame({x: centers, 'count': counts, color: group}))
+        binned = pd.concat(frames, ignore_index=True) if frames else \
+            pd.DataFrame({x: [], 'count': [], color: []})
+    fig = px.bar(binned, x=x, y='count', color=color, title=title, **kwargs)
+    fig.update_traces(width=float(edges[1] - edges[0]))
+    fig.update_layout(bargap=0, barmode='relative')
+    note = f"{len(df):,} rows pre-binned into {len(centers)} bins"
+    return fig, note
+
+
+def box(df, x, y, title=None, budget=MAX_SCATTER_POINTS):
+    """Box plot from precomputed quartiles per ``x`` group; returns ``(fig, note)``
+
+    Whiskers follow Plotly's default (furthest point within 1.5 IQR), and
+    outliers are drawn from a stratified sample within the point budget.
+    """
+    data = df[[x, y]].dropna()
+    if data.empty:
+        fig = go.Figure()
+        fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+        return fig, "No rows to summarize"
+    grouped = data.groupby(x, observed=True, sort=True)[y]
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    q1, median, q3 = quartiles[0.25], quartiles[0.5], quartiles[0.75]
+    iqr = q3 - q1
+
+    group_keys = data[x]
+    low_limit = group_keys.map(q1 - 1.5 * iqr).astype('float64')
+    high_limit = group_keys.map(q3 + 1.5 * iqr).astype('float64')
+    inside = (data[y] >= low_limit) & (data[y] <= high_limit)
+    fences = data[inside].groupby(x, observed=True, sort=True)[y].agg(['min', 'max'])
+    fences = fences.reindex(quartiles.index)
+
+    fig = go.Figure(go.Box(
+        x=list(quartiles.index), q1=q1.tolist(), median=median.tolist(), q3=q3.tolist(),
+        lowerfence=fences['min'].tolist(), upperfence=fences['max'].tolist(),
+        name=y, boxpoints=False,
+    ))
+    outliers = stratified_sample(data[~inside], x, budget)
+    if len(outliers):
+        fig.add_trace(go.Scatter(x=outliers[x], y=outliers[y], mode='markers',
+                                 name='outliers', showlegend=False, marker=dict(size=4)))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    note = f"{len(data):,} rows summarized; {len(outliers):,} outlier points drawn"
+    return fig, note
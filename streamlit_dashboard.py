@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from filter_index import ALL
+from incremental import LiveDataset
+from aggregates import AggregateCube
+from correlation import MomentAccumulator
+from density import DensityGrids
+import charts
+from figure_cache import FigureCache
+import profiler
+import os
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -46,150 +49,250 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Load and cache data
-@st.cache_data
-def load_data():
-    """Load and preprocess the sleep health dataset"""
-    try:
-        df = pd.read_csv('Sleep_health_and_lifestyle_dataset.csv')
-        
-        # Feature engineering
-        def categorize_age(age):
-            if age < 30:
-                return '18-29'
-            elif age < 40:
-                return '30-39'
-            elif age < 50:
-                return '40-49'
-            elif age < 60:
-                return '50-59'
-            else:
-                return '60+'
+DATA_FILE = 'Sleep_health_and_lifestyle_dataset.csv'
+PROFILE_HISTORY = 50  # reruns kept for the trace download
 
-        def categorize_activity(steps):
-            if steps < 5000:
-                return 'Low Activity'
-            elif steps < 8000:
-                return 'Moderate Activity'
-            else:
-                return 'High Activity'
+# Multi-select sidebar filters; range sliders cover the index's range columns
+CATEGORY_FILTERS = {
+    'Age Group': "Select Age Groups",
+    'Occupation': "Select Occupations",
+    'Sleep Disorder Status': "Select Sleep Disorder Status",
+    'BMI Category': "Select BMI Categories",
+    'Gender': "Select Gender",
+}
 
-        def categorize_sleep_quality(quality):
-            if quality <= 4:
-                return 'Poor'
-            elif quality <= 6:
-                return 'Fair'
-            elif quality <= 8:
-                return 'Good'
-            else:
-                return 'Excellent'
+# Load and cache data
+@st.cache_resource
+def get_live_dataset():
+    """Preprocessed dataset plus its filter index, cube and correlation partials
 
-        def categorize_stress(stress):
-            if stress <= 3:
-                return 'Low (1-3)'
-            elif stress <= 6:
-                return 'Medium (4-6)'
-            else:
-                return 'High (7-10)'
+    Shared by all sessions. The frame is memory-mapped from the published
+    cache version, so server processes sharing a cache directory also share
+    its memory. Rows appended to the CSV are folded in incrementally on the
+    next rerun; any other edit triggers a full reload.
+    """
+    return LiveDataset(DATA_FILE, density_pairs=charts.relationship_pairs())
 
-        # Apply feature engineering
-        df['Age Group'] = df['Age'].apply(categorize_age)
-        df['Sleep Efficiency'] = df['Sleep Duration'] / 8 * 100
-        df['Activity Level'] = df['Daily Steps'].apply(categorize_activity)
-        df['Sleep Quality Category'] = df['Quality of Sleep'].apply(categorize_sleep_quality)
-        df['Stress Category'] = df['Stress Level'].apply(categorize_stress)
-        df['Sleep Disorder Status'] = df['Sleep Disorder'].fillna('No Disorder')
-        
-        return df
+def load_data():
+    """Current snapshot of the sleep health dataset, or None if the file is missing"""
+    try:
+        return get_live_dataset().refresh()
     except FileNotFoundError:
+        get_live_dataset.clear()
         st.error("Dataset file not found! Please ensure 'Sleep_health_and_lifestyle_dataset.csv' is in the same directory.")
         return None
 
+def filtered_cube(dataset, predicates, filtered_df):
+    """Aggregate cube for the filtered rows
+
+    Filters on cube dimensions are answered from the precomputed cube; range
+    filters need the filtered rows themselves.
+    """
+    if set(predicates) <= set(dataset.cube.dimensions):
+        return dataset.cube.where(predicates)
+    return AggregateCube.from_frame(filtered_df)
+
+def filtered_moments(dataset, predicates, filtered_df):
+    """Correlation moments for the filtered rows (see ``filtered_cube``)"""
+    if set(predicates) <= set(dataset.moments.segment_columns):
+        return dataset.moments.where(predicates)
+    return MomentAccumulator.from_frame(filtered_df)
+
+def filtered_density(dataset, predicates, filtered_df):
+    """Relationship density grids for the filtered rows (see ``filtered_cube``)"""
+    if set(predicates) <= set(dataset.density.segment_columns):
+        return lambda pair: dataset.density.where(pair, predicates)
+    density = DensityGrids.from_frame(filtered_df, dataset.density.pairs, segment_columns=(),
+                                      axes=dataset.density.axes)
+    return lambda pair: density.where(pair, {})
+
+def disorder_rate(cube):
+    """Percentage of participants with any sleep disorder"""
+    counts = cube.count('Sleep Disorder Status')
+    return (1 - counts.get('No Disorder', 0) / counts.sum()) * 100
+
 # Main dashboard function
 def main():
     # Header
     st.markdown('<h1 class="main-header">😴 Sleep Health & Lifestyle Analysis Dashboard</h1>', unsafe_allow_html=True)
     
+    # Timing spans are only recorded when profiling is switched on
+    profile = profiler.start(profiling_enabled())
+    
     # Load data
-    df = load_data()
-    if df is None:
+    with profiler.span('load_data') as span:
+        dataset = load_data()
+        span.rows = None if dataset is None else dataset.n_rows
+    if dataset is None:
         return
+    index, full_cube = dataset.index, dataset.cube
     
-    # Sidebar filters
+    # Sidebar filters (an empty multi-select keeps every value)
     st.sidebar.header("🔍 Filters & Controls")
     
-    # Age group filter
-    age_groups = ['All'] + list(df['Age Group'].unique())
-    selected_age = st.sidebar.selectbox("Select Age Group", age_groups)
+    selection = {}
+    for column, label in CATEGORY_FILTERS.items():
+        if column in index.columns:
+            selection[column] = st.sidebar.multiselect(label, index.values(column), placeholder=ALL)
     
-    # Occupation filter
-    occupations = ['All'] + list(df['Occupation'].unique())
-    selected_occupation = st.sidebar.selectbox("Select Occupation", occupations)
+    # Range filters
+    for column in index.range_columns:
+        low, high = (value.item() for value in index.value_range(column))
+        if low < high:
+            selection[column] = st.sidebar.slider(column, low, high, (low, high))
     
-    # Sleep disorder filter
-    disorders = ['All'] + list(df['Sleep Disorder Status'].unique())
-    selected_disorder = st.sidebar.selectbox("Select Sleep Disorder Status", disorders)
-    
-    # Apply filters
-    filtered_df = df.copy()
-    if selected_age != 'All':
-        filtered_df = filtered_df[filtered_df['Age Group'] == selected_age]
-    if selected_occupation != 'All':
-        filtered_df = filtered_df[filtered_df['Occupation'] == selected_occupation]
-    if selected_disorder != 'All':
-        filtered_df = filtered_df[filtered_df['Sleep Disorder Status'] == selected_disorder]
+    # Apply filters (the index plans the predicates; no full-frame copy)
+    with profiler.span('filter') as span:
+        filtered_df = dataset.select(selection)
+        span.rows = len(filtered_df)
+    predicates = dict(index.normalize(selection))
     
     # Display dataset overview
     st.sidebar.markdown("---")
     st.sidebar.write(f"**Filtered Dataset:** {len(filtered_df)} participants")
-    st.sidebar.write(f"**Total Dataset:** {len(df)} participants")
+    st.sidebar.write(f"**Total Dataset:** {dataset.n_rows} participants")
+    if admin_enabled():
+        admin_panel()
+    st.sidebar.toggle("⏱️ Profile reruns", value=profiler.env_enabled(), key='profile_reruns')
+    
+    if filtered_df.empty:
+        st.warning("No participants match the selected filters.")
+        return
+    with profiler.span('aggregates'):
+        cube = filtered_cube(dataset, predicates, filtered_df)
     
     # Main dashboard layout
     col1, col2, col3, col4 = st.columns(4)
+    overall_means = full_cube.mean(['Sleep Duration', 'Quality of Sleep', 'Stress Level'])
+    filtered_means = cube.mean(['Sleep Duration', 'Quality of Sleep', 'Stress Level'])
     
     with col1:
-        avg_sleep = filtered_df['Sleep Duration'].mean()
+        avg_sleep = filtered_means['Sleep Duration']
         st.metric("Average Sleep Duration", f"{avg_sleep:.2f} hours", 
-                 delta=f"{avg_sleep - df['Sleep Duration'].mean():.2f}h vs overall")
+                 delta=f"{avg_sleep - overall_means['Sleep Duration']:.2f}h vs overall")
     
     with col2:
-        avg_quality = filtered_df['Quality of Sleep'].mean()
+        avg_quality = filtered_means['Quality of Sleep']
         st.metric("Average Sleep Quality", f"{avg_quality:.1f}/10",
-                 delta=f"{avg_quality - df['Quality of Sleep'].mean():.1f} vs overall")
+                 delta=f"{avg_quality - overall_means['Quality of Sleep']:.1f} vs overall")
     
     with col3:
-        avg_stress = filtered_df['Stress Level'].mean()
+        avg_stress = filtered_means['Stress Level']
         st.metric("Average Stress Level", f"{avg_stress:.1f}/10",
-                 delta=f"{avg_stress - df['Stress Level'].mean():.1f} vs overall")
+                 delta=f"{avg_stress - overall_means['Stress Level']:.1f} vs overall")
     
     with col4:
-        disorder_rate = (filtered_df['Sleep Disorder Status'] != 'No Disorder').mean() * 100
-        overall_rate = (df['Sleep Disorder Status'] != 'No Disorder').mean() * 100
-        st.metric("Sleep Disorder Rate", f"{disorder_rate:.1f}%",
-                 delta=f"{disorder_rate - overall_rate:.1f}% vs overall")
-    
-    # Tabs for different analyses
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        filtered_rate = disorder_rate(cube)
+        overall_rate = disorder_rate(full_cube)
+        st.metric("Sleep Disorder Rate", f"{filtered_rate:.1f}%",
+                 delta=f"{filtered_rate - overall_rate:.1f}% vs overall")
+    
+    # Tabs for different analyses; only the selected tab builds its figures
+    filter_key = (dataset.version, index.normalize(selection))
+    tab1, tab2, tab3, tab4, tab5 = section_tabs([
         "📊 Overview", "🏢 Occupation Analysis", "📈 Correlations", 
         "👥 Demographics", "🔍 Individual Explorer"
     ])
     
+    rows = len(filtered_df)
+    
     with tab1:
-        overview_tab(filtered_df, df)
+        if is_open(tab1):
+            with profiler.span('tab.overview', rows):
+                overview_tab(filtered_df, cube, filter_key)
     
     with tab2:
-        occupation_tab(filtered_df, df)
+        if is_open(tab2):
+            with profiler.span('tab.occupation', rows):
+                occupation_tab(filtered_df, cube, filter_key)
     
     with tab3:
-        correlation_tab(filtered_df, df)
+        if is_open(tab3):
+            with profiler.span('tab.correlation', rows):
+                correlation_tab(filtered_df, filtered_moments(dataset, predicates, filtered_df), filter_key,
+                                lambda: (filtered_density(dataset, predicates, filtered_df), dataset.density.axes))
     
     with tab4:
-        demographics_tab(filtered_df, df)
+        if is_open(tab4):
+            with profiler.span('tab.demographics', rows):
+                demographics_tab(filtered_df, cube, filter_key)
     
     with tab5:
-        individual_explorer_tab(filtered_df, df)
+        if is_open(tab5):
+            with profiler.span('tab.explorer', rows):
+                individual_explorer_tab(filtered_df, cube, filter_key)
+    
+    if profile.enabled:
+        profile_panel(profile)
+
+def section_tabs(labels):
+    """Tabs that rerun on selection so only the open one renders its content"""
+    try:
+        return st.tabs(labels, key='section', on_change='rerun')
+    except TypeError:
+        # Streamlit without lazy tabs: every tab renders, as before
+        return st.tabs(labels)
 
-def overview_tab(filtered_df, full_df):
+def admin_enabled():
+    # Set by whoever runs the server; the panel acts on the cache all sessions share
+    return os.environ.get('SLEEP_DASHBOARD_ADMIN') == '1'
+
+def admin_panel():
+    """Sidebar panel with figure cache statistics (``SLEEP_DASHBOARD_ADMIN=1``)"""
+    stats = get_figure_cache().stats()
+    with st.sidebar.expander("⚙️ Admin: Figure Cache"):
+        st.write(f"**Hits / misses:** {stats['hits']} / {stats['misses']} "
+                 f"({stats['hit_rate']:.0%} hit rate)")
+        st.write(f"**Entries:** {stats['entries']}  **Evictions:** {stats['evictions']}")
+        st.write(f"**Memory:** {stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MiB")
+        if st.button("Clear figure cache"):
+            get_figure_cache().clear()
+
+def profiling_enabled():
+    """Sidebar toggle, defaulting to ``SLEEP_DASHBOARD_PROFILE=1``"""
+    return st.session_state.get('profile_reruns', profiler.env_enabled())
+
+def profile_panel(profile):
+    """Timing breakdown of this rerun plus a JSON lines export of the session's traces"""
+    records = profile.records()
+    trace = profile.to_jsonl()
+    trace_file = os.environ.get(profiler.TRACE_FILE_ENV)
+    if trace_file:
+        profile.export(trace_file)
+    history = st.session_state.setdefault('profile_traces', [])
+    history.append(trace)
+    del history[:-PROFILE_HISTORY]
+    
+    with st.expander(f"⏱️ Rerun Profile ({records[0]['duration_ms']:.0f} ms)", expanded=True):
+        st.plotly_chart(charts.profile_flame(records), use_container_width=True)
+        spans = pd.DataFrame(records)[['path', 'rows', 'duration_ms', 'self_ms']]
+        st.dataframe(spans.sort_values('self_ms', ascending=False), use_container_width=True,
+                     hide_index=True)
+        st.download_button("Download traces (JSON lines)", data=''.join(history),
+                           file_name="dashboard_traces.jsonl", mime="application/x-ndjson")
+
+def is_open(tab):
+    return getattr(tab, 'open', None) is not False
+
+@st.cache_resource
+def get_figure_cache():
+    """Figure cache shared by all sessions of this server process"""
+    return FigureCache()
+
+def show_chart(chart_id, filter_key, build):
+    """Render a chart from the shared figure cache, building it on a miss
+
+    ``build`` returns a figure or ``(figure, note)``. Identical selections
+    from any session reuse the serialized figure.
+    """
+    with profiler.span(f'chart.{chart_id}'):
+        fig, note = get_figure_cache().get_or_build((chart_id, filter_key), build)
+        with profiler.span('render'):
+            st.plotly_chart(fig, use_container_width=True)
+    if note:
+        st.caption(note)
+
+def overview_tab(filtered_df, cube, filter_key):
     """Overview tab with key insights and distributions"""
     st.header("📊 Sleep Health Overview")
     
@@ -197,31 +300,16 @@ def overview_tab(filtered_df, full_df):
     
     with col1:
         st.subheader("Sleep Disorder Distribution")
-        disorder_counts = filtered_df['Sleep Disorder Status'].value_counts()
-        fig = px.pie(values=disorder_counts.values, names=disorder_counts.index,
-                    title="Sleep Disorder Distribution",
-                    color_discrete_sequence=px.colors.qualitative.Set3)
-        fig.update_traces(textposition='inside', textinfo='percent+label')
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('overview.disorder_pie', filter_key, lambda: charts.disorder_pie(cube))
     
     with col2:
         st.subheader("Sleep Quality Distribution")
-        quality_counts = filtered_df['Sleep Quality Category'].value_counts()
-        fig = px.bar(x=quality_counts.index, y=quality_counts.values,
-                    title="Sleep Quality Distribution",
-                    color=quality_counts.values,
-                    color_continuous_scale='viridis')
-        fig.update_layout(xaxis_title="Sleep Quality", yaxis_title="Count")
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('overview.quality_bar', filter_key, lambda: charts.sleep_quality_bar(cube))
     
     # Sleep duration distribution
     st.subheader("Sleep Duration Distribution")
-    fig = px.histogram(filtered_df, x='Sleep Duration', nbins=20,
-                      title="Sleep Duration Distribution",
-                      color_discrete_sequence=['#1f77b4'])
-    fig.add_vline(x=filtered_df['Sleep Duration'].mean(), line_dash="dash",
-                  annotation_text=f"Mean: {filtered_df['Sleep Duration'].mean():.2f}h")
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart('overview.duration_histogram', filter_key,
+               lambda: charts.sleep_duration_histogram(filtered_df, cube))
     
     # Key insights
     st.markdown('<div class="insight-box">', unsafe_allow_html=True)
@@ -229,132 +317,86 @@ def overview_tab(filtered_df, full_df):
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        best_occupation = filtered_df.groupby('Occupation')['Sleep Duration'].mean().idxmax()
-        best_sleep = filtered_df.groupby('Occupation')['Sleep Duration'].mean().max()
-        st.write(f"**Best Sleeping Occupation:** {best_occupation} ({best_sleep:.2f}h)")
+        occupation_means = cube.mean('Sleep Duration', by='Occupation')
+        st.write(f"**Best Sleeping Occupation:** {occupation_means.idxmax()} ({occupation_means.max():.2f}h)")
     
     with col2:
-        highest_stress_disorder = filtered_df[filtered_df['Sleep Disorder Status'] != 'No Disorder'].groupby('Sleep Disorder Status')['Stress Level'].mean().idxmax()
-        stress_value = filtered_df[filtered_df['Sleep Disorder Status'] != 'No Disorder'].groupby('Sleep Disorder Status')['Stress Level'].mean().max()
-        st.write(f"**Highest Stress Disorder:** {highest_stress_disorder} ({stress_value:.1f}/10)")
+        disorder_stress = cube.mean('Stress Level', by='Sleep Disorder Status').drop('No Disorder', errors='ignore')
+        if disorder_stress.empty:
+            st.write("**Highest Stress Disorder:** no participants with a disorder")
+        else:
+            st.write(f"**Highest Stress Disorder:** {disorder_stress.idxmax()} ({disorder_stress.max():.1f}/10)")
     
     with col3:
-        best_age = filtered_df.groupby('Age Group')['Sleep Duration'].mean().idxmax()
-        best_age_sleep = filtered_df.groupby('Age Group')['Sleep Duration'].mean().max()
-        st.write(f"**Best Sleeping Age Group:** {best_age} ({best_age_sleep:.2f}h)")
+        age_means = cube.mean('Sleep Duration', by='Age Group')
+        st.write(f"**Best Sleeping Age Group:** {age_means.idxmax()} ({age_means.max():.2f}h)")
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def occupation_tab(filtered_df, full_df):
+def occupation_tab(filtered_df, cube, filter_key):
     """Occupation analysis tab"""
     st.header("🏢 Occupation Analysis")
     
     # Sleep duration by occupation
-    occupation_sleep = filtered_df.groupby('Occupation')['Sleep Duration'].agg(['mean', 'count']).reset_index()
-    occupation_sleep.columns = ['Occupation', 'Average Sleep', 'Count']
-    occupation_sleep = occupation_sleep.sort_values('Average Sleep', ascending=True)
-    
-    fig = px.bar(occupation_sleep, x='Average Sleep', y='Occupation',
-                orientation='h', title="Average Sleep Duration by Occupation",
-                color='Average Sleep', color_continuous_scale='viridis',
-                hover_data=['Count'])
-    fig.update_layout(height=500)
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart('occupation.sleep_bar', filter_key, lambda: charts.occupation_sleep_bar(cube))
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Sleep Quality by Occupation")
-        quality_by_occ = filtered_df.groupby('Occupation')['Quality of Sleep'].mean().sort_values(ascending=False)
-        fig = px.bar(x=quality_by_occ.values, y=quality_by_occ.index,
-                    orientation='h', title="Average Sleep Quality by Occupation",
-                    color=quality_by_occ.values, color_continuous_scale='plasma')
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('occupation.quality_bar', filter_key, lambda: charts.occupation_quality_bar(cube))
     
     with col2:
         st.subheader("Stress Level by Occupation")
-        stress_by_occ = filtered_df.groupby('Occupation')['Stress Level'].mean().sort_values(ascending=True)
-        fig = px.bar(x=stress_by_occ.values, y=stress_by_occ.index,
-                    orientation='h', title="Average Stress Level by Occupation",
-                    color=stress_by_occ.values, color_continuous_scale='reds')
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('occupation.stress_bar', filter_key, lambda: charts.occupation_stress_bar(cube))
     
     # Occupation vs Sleep Disorder
     st.subheader("Sleep Disorders by Occupation")
-    occ_disorder = pd.crosstab(filtered_df['Occupation'], filtered_df['Sleep Disorder Status'], normalize='index') * 100
-    fig = px.bar(occ_disorder, title="Sleep Disorder Percentage by Occupation",
-                color_discrete_sequence=px.colors.qualitative.Set3)
-    fig.update_layout(yaxis_title="Percentage (%)", xaxis_title="Occupation")
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart('occupation.disorder_bar', filter_key, lambda: charts.occupation_disorder_bar(cube))
 
-def correlation_tab(filtered_df, full_df):
-    """Correlation analysis tab"""
+def correlation_tab(filtered_df, moments, filter_key, density=None):
+    """Correlation analysis tab
+
+    ``density`` returns ``(grid lookup, axes)`` for the relationship heatmaps.
+    """
     st.header("📈 Correlation Analysis")
     
-    # Correlation matrix
-    numeric_cols = ['Age', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level',
-                   'Stress Level', 'Heart Rate', 'Daily Steps', 'Sleep Efficiency']
-    
-    correlation_matrix = filtered_df[numeric_cols].corr()
+    # Correlation matrix, merged from the cached per-segment moment partials
+    correlation_matrix = moments.correlation()
     
     # Interactive correlation heatmap
-    fig = px.imshow(correlation_matrix, 
-                   title="Sleep Health Correlation Matrix",
-                   color_continuous_scale='RdBu_r',
-                   color_continuous_midpoint=0,
-                   text_auto='.2f')
-    fig.update_layout(height=600)
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart('correlation.heatmap', filter_key, lambda: charts.correlation_heatmap(correlation_matrix))
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Sleep Duration Correlations")
-        sleep_corrs = correlation_matrix['Sleep Duration'].drop('Sleep Duration').sort_values(key=abs, ascending=False)
-        
-        fig = px.bar(x=sleep_corrs.values, y=sleep_corrs.index,
-                    orientation='h', title="Correlations with Sleep Duration",
-                    color=sleep_corrs.values, color_continuous_scale='RdBu_r',
-                    color_continuous_midpoint=0)
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('correlation.sleep_bar', filter_key, lambda: charts.correlation_bar(
+            correlation_matrix, 'Sleep Duration', "Correlations with Sleep Duration"))
     
     with col2:
         st.subheader("Sleep Quality Correlations")
-        quality_corrs = correlation_matrix['Quality of Sleep'].drop('Quality of Sleep').sort_values(key=abs, ascending=False)
-        
-        fig = px.bar(x=quality_corrs.values, y=quality_corrs.index,
-                    orientation='h', title="Correlations with Sleep Quality",
-                    color=quality_corrs.values, color_continuous_scale='RdBu_r',
-                    color_continuous_midpoint=0)
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('correlation.quality_bar', filter_key, lambda: charts.correlation_bar(
+            correlation_matrix, 'Quality of Sleep', "Correlations with Sleep Quality"))
     
     # Scatter plots for key relationships
     st.subheader("Key Relationships")
     
-    scatter_options = st.selectbox("Select Relationship to Explore:",
-                                  ["Sleep Duration vs Quality", "Stress vs Sleep Duration",
-                                   "Daily Steps vs Sleep Duration", "Age vs Sleep Duration"])
-    
-    if scatter_options == "Sleep Duration vs Quality":
-        fig = px.scatter(filtered_df, x='Sleep Duration', y='Quality of Sleep',
-                        color='Sleep Disorder Status', size='Physical Activity Level',
-                        hover_data=['Age', 'Occupation'], title="Sleep Duration vs Quality")
-    elif scatter_options == "Stress vs Sleep Duration":
-        fig = px.scatter(filtered_df, x='Stress Level', y='Sleep Duration',
-                        color='Sleep Disorder Status', size='Age',
-                        hover_data=['Occupation'], title="Stress Level vs Sleep Duration")
-    elif scatter_options == "Daily Steps vs Sleep Duration":
-        fig = px.scatter(filtered_df, x='Daily Steps', y='Sleep Duration',
-                        color='Activity Level', size='Physical Activity Level',
-                        hover_data=['Age', 'Occupation'], title="Daily Steps vs Sleep Duration")
+    scatter_options = st.selectbox("Select Relationship to Explore:", list(charts.RELATIONSHIPS))
+    views = ["Density", "Scatter"] if density is not None else ["Scatter"]
+    view = st.radio("View:", views, horizontal=True)
+    if view == "Density":
+        def build_density():
+            grid_for, axes = density()
+            spec = charts.RELATIONSHIPS[scatter_options]
+            return charts.relationship_density(grid_for((spec['x'], spec['y'])), axes[spec['x']],
+                                               axes[spec['y']], scatter_options)
+        show_chart(f'correlation.density.{scatter_options}', filter_key, build_density)
     else:
-        fig = px.scatter(filtered_df, x='Age', y='Sleep Duration',
-                        color='Sleep Disorder Status', size='Quality of Sleep',
-                        hover_data=['Occupation'], title="Age vs Sleep Duration")
-    
-    st.plotly_chart(fig, use_container_width=True)
+        show_chart(f'correlation.relationship.{scatter_options}', filter_key,
+                   lambda: charts.relationship_scatter(filtered_df, scatter_options))
 
-def demographics_tab(filtered_df, full_df):
+def demographics_tab(filtered_df, cube, filter_key):
     """Demographics analysis tab"""
     st.header("👥 Demographics Analysis")
     
@@ -362,48 +404,29 @@ def demographics_tab(filtered_df, full_df):
     
     with col1:
         st.subheader("Sleep Patterns by Age Group")
-        age_sleep = filtered_df.groupby('Age Group')[['Sleep Duration', 'Quality of Sleep', 'Stress Level']].mean()
-        
-        fig = px.bar(age_sleep, title="Sleep Metrics by Age Group",
-                    barmode='group', color_discrete_sequence=px.colors.qualitative.Set2)
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('demographics.age_metrics', filter_key, lambda: charts.age_metrics_bar(cube))
     
     with col2:
         st.subheader("Sleep Disorders by Age Group")
-        age_disorder = pd.crosstab(filtered_df['Age Group'], filtered_df['Sleep Disorder Status'], normalize='index') * 100
-        
-        fig = px.bar(age_disorder, title="Sleep Disorder Distribution by Age Group",
-                    color_discrete_sequence=px.colors.qualitative.Set3)
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart('demographics.age_disorder', filter_key, lambda: charts.age_disorder_bar(cube))
     
     # Gender analysis if gender column exists
-    if 'Gender' in filtered_df.columns:
+    if 'Gender' in cube.dimensions:
         col3, col4 = st.columns(2)
         
         with col3:
             st.subheader("Sleep Duration by Gender")
-            gender_sleep = filtered_df.groupby('Gender')['Sleep Duration'].mean()
-            fig = px.bar(x=gender_sleep.index, y=gender_sleep.values,
-                        title="Average Sleep Duration by Gender",
-                        color=gender_sleep.values, color_continuous_scale='viridis')
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart('demographics.gender_sleep', filter_key, lambda: charts.gender_sleep_bar(cube))
         
         with col4:
             st.subheader("Sleep Disorders by Gender")
-            gender_disorder = pd.crosstab(filtered_df['Gender'], filtered_df['Sleep Disorder Status'], normalize='index') * 100
-            fig = px.bar(gender_disorder, title="Sleep Disorder Rate by Gender",
-                        color_discrete_sequence=px.colors.qualitative.Pastel)
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart('demographics.gender_disorder', filter_key, lambda: charts.gender_disorder_bar(cube))
     
     # Activity level analysis
     st.subheader("Physical Activity Impact")
-    activity_metrics = filtered_df.groupby('Activity Level')[['Sleep Duration', 'Quality of Sleep', 'Stress Level']].mean()
-    
-    fig = px.bar(activity_metrics, title="Sleep Metrics by Activity Level",
-                barmode='group', color_discrete_sequence=px.colors.qualitative.Bold)
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart('demographics.activity_metrics', filter_key, lambda: charts.activity_metrics_bar(cube))
 
-def individual_explorer_tab(filtered_df, full_df):
+def individual_explorer_tab(filtered_df, cube, filter_key):
     """Individual data explorer tab"""
     st.header("🔍 Individual Data Explorer")
     
@@ -434,18 +457,8 @@ def individual_explorer_tab(filtered_df, full_df):
                                     'Activity Level', 'Sleep Quality Category'])
     
     # Generate custom chart
-    if chart_type == 'Scatter Plot':
-        fig = px.scatter(filtered_df, x=x_axis, y=y_axis, color=color_by,
-                        hover_data=['Occupation', 'Age'], title=f"{x_axis} vs {y_axis}")
-    elif chart_type == 'Box Plot':
-        fig = px.box(filtered_df, x=color_by, y=x_axis, title=f"{x_axis} by {color_by}")
-    elif chart_type == 'Histogram':
-        fig = px.histogram(filtered_df, x=x_axis, color=color_by, title=f"{x_axis} Distribution")
-    else:  # Bar Chart
-        grouped_data = filtered_df.groupby(color_by)[x_axis].mean().reset_index()
-        fig = px.bar(grouped_data, x=color_by, y=x_axis, title=f"Average {x_axis} by {color_by}")
-    
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart(f'explorer.{chart_type}.{x_axis}.{y_axis}.{color_by}', filter_key,
+               lambda: charts.custom_chart(filtered_df, cube, chart_type, x_axis, y_axis, color_by))
     
     # Data table
     st.subheader("Filtered Data Table")
@@ -459,10 +472,16 @@ def individual_explorer_tab(filtered_df, full_df):
     if show_columns:
         st.dataframe(filtered_df[show_columns], use_container_width=True)
     
-    # Download filtered data
-    if st.button("Download Filtered Data"):
-        csv = filtered_df.to_csv(index=False)
-        st.download_button(label="Download CSV", data=csv, file_name="filtered_sleep_data.csv", mime="text/csv")
+    # Download filtered data: encoded in chunks on a background thread, only
+    # when the button is clicked, and without rerunning the script. Imported
+    # here so only sessions that open this tab load the Parquet writer
+    import export
+    export_format = st.selectbox("Download format:", export.available_formats())
+    extension, mime = export.EXPORT_FORMATS[export_format]
+    export_columns = show_columns or filtered_df.columns.tolist()
+    st.download_button(label="Download Filtered Data",
+                       data=lambda: export.export_file(filtered_df, export_columns, export_format),
+                       file_name=f"filtered_sleep_data.{extension}", mime=mime, on_click='ignore')
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,80 @@
+"""Density grids folded in batch by batch against grids binned in one go"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cache import read_source
+from density import MAX_BINS, Axis, DensityGrids
+
+DATA_FILE = Path(__file__).parent / 'Sleep_health_and_lifestyle_dataset.csv'
+
+PAIRS = [('Daily Steps', 'Sleep Duration'), ('Age', 'Quality of Sleep'), ('Stress Level', 'Daily Steps')]
+
+
+def batches(df, seed=0):
+    """Batches with unseen, out-of-range and missing values"""
+    rng = np.random.default_rng(seed)
+    many = df.sample(400, replace=True, random_state=seed).reset_index(drop=True)
+    # More distinct step counts than MAX_BINS turns the axis equal-width
+    many['Daily Steps'] = rng.integers(3000, 10000, len(many))
+    wide = df.head(20).copy()
+    wide['Daily Steps'] = np.linspace(0, 200_000, len(wide)).round()
+    wide['Age'] = np.r_[[5, 95], wide['Age'][2:]]
+    gaps = df.tail(10).copy()
+    gaps['Sleep Duration'] = np.nan
+    below = df.head(5).copy()
+    below['Daily Steps'] = -50_000
+    return [many, wide, gaps, below]
+
+
+def assert_same_counts(grown, fresh):
+    for pair in PAIRS:
+        for key in fresh.keys:
+            expected = fresh.grids[pair][fresh._key_index[key]]
+            assert np.array_equal(grown.grids[pair][grown._key_index[key]], expected), (pair, key)
+
+
+def test_batches_match_one_pass_and_stay_bounded():
+    df = read_source(DATA_FILE)
+    grown = DensityGrids.from_frame(df, PAIRS)
+    frames = [df]
+    for batch in batches(df):
+        grown.add(batch)
+        frames.append(batch)
+        for pair in PAIRS:
+            assert grown.grids[pair].shape[1] <= MAX_BINS and grown.grids[pair].shape[2] <= MAX_BINS
+        combined = pd.concat(frames, ignore_index=True)
+        assert_same_counts(grown, DensityGrids.from_frame(combined, PAIRS, axes=grown.axes))
+    assert not grown.axes['Daily Steps'].discrete
+    steps = grown.axes['Daily Steps']
+    assert steps.edges[0] <= -50_000 and steps.edges[-1] > 200_000
+
+
+def test_copy_is_unaffected_by_add():
+    df = read_source(DATA_FILE)
+    grids = DensityGrids.from_frame(df, PAIRS)
+    before = {pair: grids.grids[pair].copy() for pair in PAIRS}
+    grids.copy().add(batches(df)[1])
+    for pair in PAIRS:
+        assert np.array_equal(grids.grids[pair], before[pair])
+
+
+@pytest.mark.parametrize('values', [np.arange(0, 1000.0), np.linspace(-3.5, 7.25, 400)])
+def test_equal_width_axis_covers_its_extremes(values):
+    axis = Axis.from_values('x', values)
+    assert not axis.discrete and len(axis.centers) == MAX_BINS
+    bins = axis.bins(values)
+    assert bins.min() == 0 and bins.max() == MAX_BINS - 1
+    assert ((axis.edges[bins] <= values) & (values < axis.edges[bins + 1])).all()
+
+
+def test_merged_bins_nest():
+    axis = Axis.from_values('x', np.arange(0, 1000.0))
+    grown, positions = axis.extended(np.array([-2500.0, 4321.0]))
+    assert len(grown.centers) <= MAX_BINS
+    assert (np.diff(positions) >= 0).all()
+    # Every old bin lies inside the new bin it was moved to
+    assert (grown.edges[positions] <= axis.edges[:-1]).all()
+    assert (axis.edges[1:] <= grown.edges[positions + 1]).all()
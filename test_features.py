@@ -0,0 +1,111 @@
+"""Label parity between the BinSpec features and the original if/elif functions"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import (ACTIVITY_LEVEL, AGE_GROUP, BINNED_FEATURES, SLEEP_QUALITY_CATEGORY,
+                      STRESS_CATEGORY, engineer_features)
+
+DATA_FILE = Path(__file__).parent / 'Sleep_health_and_lifestyle_dataset.csv'
+
+
+# The per-row functions load_data() used before the features were vectorized
+def categorize_age(age):
+    if age < 30:
+        return '18-29'
+    elif age < 40:
+        return '30-39'
+    elif age < 50:
+        return '40-49'
+    elif age < 60:
+        return '50-59'
+    else:
+        return '60+'
+
+
+def categorize_activity(steps):
+    if steps < 5000:
+        return 'Low Activity'
+    elif steps < 8000:
+        return 'Moderate Activity'
+    else:
+        return 'High Activity'
+
+
+def categorize_sleep_quality(quality):
+    if quality <= 4:
+        return 'Poor'
+    elif quality <= 6:
+        return 'Fair'
+    elif quality <= 8:
+        return 'Good'
+    else:
+        return 'Excellent'
+
+
+def categorize_stress(stress):
+    if stress <= 3:
+        return 'Low (1-3)'
+    elif stress <= 6:
+        return 'Medium (4-6)'
+    else:
+        return 'High (7-10)'
+
+
+REFERENCE = {
+    AGE_GROUP: categorize_age,
+    ACTIVITY_LEVEL: categorize_activity,
+    SLEEP_QUALITY_CATEGORY: categorize_sleep_quality,
+    STRESS_CATEGORY: categorize_stress,
+}
+
+# Values on and either side of every bin edge
+EDGE_VALUES = {
+    AGE_GROUP: [0, 18, 29, 29.999, 30, 30.001, 39.999, 40, 49.999, 50, 59.999, 60, 60.001, 120],
+    ACTIVITY_LEVEL: [0, 4999, 4999.999, 5000, 5000.001, 7999, 7999.999, 8000, 8001, 100_000],
+    SLEEP_QUALITY_CATEGORY: [0, 1, 3.999, 4, 4.0001, 5, 6, 6.0001, 7, 8, 8.0001, 9, 10],
+    STRESS_CATEGORY: [0, 1, 3, 3.0001, 4, 6, 6.0001, 7, 10],
+}
+
+
+def test_every_spec_has_a_reference():
+    assert set(REFERENCE) == set(BINNED_FEATURES)
+
+
+@pytest.mark.parametrize('spec', BINNED_FEATURES, ids=lambda spec: spec.name)
+def test_matches_reference_on_dataset(spec):
+    df = pd.read_csv(DATA_FILE)
+    expected = df[spec.source].apply(REFERENCE[spec]).tolist()
+    assert spec.apply(df[spec.source]).astype(str).tolist() == expected
+
+
+@pytest.mark.parametrize('spec', BINNED_FEATURES, ids=lambda spec: spec.name)
+def test_matches_reference_at_edges(spec):
+    values = pd.Series(EDGE_VALUES[spec], dtype='float64')
+    expected = [REFERENCE[spec](value) for value in values]
+    assert spec.apply(values).astype(str).tolist() == expected
+
+
+@pytest.mark.parametrize('spec', BINNED_FEATURES, ids=lambda spec: spec.name)
+def test_labels_are_ordered_categories(spec):
+    binned = spec.apply(pd.Series(EDGE_VALUES[spec], dtype='float64'))
+    assert binned.cat.ordered
+    assert tuple(binned.cat.categories) == spec.labels
+
+
+@pytest.mark.parametrize('spec', BINNED_FEATURES, ids=lambda spec: spec.name)
+def test_missing_values_stay_missing(spec):
+    # Intentional difference: the if/elif chains sent NaN to the last label
+    # (every comparison with NaN is False); a missing measurement is not
+    # evidence of e.g. '60+', so it is left missing
+    assert REFERENCE[spec](np.nan) == spec.labels[-1]
+    assert spec.apply(pd.Series([np.nan])).isna().all()
+
+
+def test_engineer_features_matches_reference():
+    df = engineer_features(pd.read_csv(DATA_FILE))
+    for spec, reference in REFERENCE.items():
+        assert df[spec.name].astype(str).tolist() == df[spec.source].apply(reference).tolist()
+    assert (df['Sleep Disorder Status'] == df['Sleep Disorder'].fillna('No Disorder')).all()
@@ -0,0 +1,176 @@
+"""FilterIndex lookups against plain boolean masks"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_index import ALL, DENSE_FRACTION, FilterIndex, SplitIndex, _sorted_union, apply_filters
+
+CATEGORIES = {
+    'Age Group': ['18-29', '30-39', '40-49', '50-59', '60+'],
+    'Occupation': [f'Job {i}' for i in range(12)],
+    'Sleep Disorder Status': ['No Disorder', 'Insomnia', 'Sleep Apnea'],
+    'BMI Category': ['Normal', 'Overweight', 'Obese'],
+    'Gender': ['Male', 'Female'],
+}
+
+
+def synthetic(n_rows, seed=0):
+    """Frame with every filter column, skewed categories and some missing cells"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        column: rng.choice(values, n_rows, p=np.arange(len(values), 0, -1) / sum(range(len(values) + 1)))
+        for column, values in CATEGORIES.items()
+    })
+    df['Age'] = rng.integers(18, 80, n_rows).astype(float)
+    df['Daily Steps'] = rng.integers(1000, 15000, n_rows).astype(float)
+    df['Heart Rate'] = rng.integers(55, 95, n_rows).astype(float)
+    df['Stress Level'] = rng.integers(1, 11, n_rows).astype(float)
+    df.loc[rng.random(n_rows) < 0.02, 'Occupation'] = None
+    df.loc[rng.random(n_rows) < 0.02, 'Heart Rate'] = np.nan
+    return df
+
+
+def naive_rows(df, selection):
+    mask = np.ones(len(df), dtype=bool)
+    for column, operand in selection.items():
+        if isinstance(operand, tuple):
+            mask &= df[column].between(*operand).to_numpy()
+        else:
+            values = [operand] if isinstance(operand, str) else list(operand)
+            if values and ALL not in values:
+                mask &= df[column].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def random_selection(rng, df):
+    selection = {}
+    for column, values in CATEGORIES.items():
+        if rng.random() < 0.5:
+            selection[column] = rng.sample(values, rng.randint(0, len(values)))
+    for column in ('Age', 'Daily Steps', 'Heart Rate', 'Stress Level'):
+        if rng.random() < 0.5:
+            low, high = df[column].min(), df[column].max()
+            selection[column] = tuple(sorted(rng.uniform(low - 1, high + 1) for _ in range(2)))
+    return selection
+
+
+def assert_matches_naive(index, df, rng, trials=300):
+    for _ in range(trials):
+        selection = random_selection(rng, df)
+        rows = index.rows(selection)
+        expected = naive_rows(df, selection)
+        assert np.array_equal(np.arange(len(df)) if rows is None else rows, expected), selection
+
+
+@pytest.mark.parametrize('n_rows', [50, 5000])
+def test_rows_match_naive_masks(n_rows):
+    df = synthetic(n_rows)
+    assert_matches_naive(FilterIndex(df), df, random.Random(n_rows))
+
+
+def test_unfiltered_selection_returns_frame():
+    df = synthetic(100)
+    index = FilterIndex(df)
+    selection = {'Gender': ALL, 'Occupation': [], 'Age': (0, 200)}
+    assert index.normalize(selection) == ()
+    assert index.rows(selection) is None
+    assert apply_filters(df, index, selection) is df
+
+
+def test_normalize_rejects_unindexed_columns():
+    with pytest.raises(KeyError):
+        FilterIndex(synthetic(10)).normalize({'Sleep Duration': (1, 2)})
+
+
+def test_plan_orders_by_exact_estimate():
+    df = synthetic(2000)
+    index = FilterIndex(df)
+    selection = {'Gender': 'Male', 'Occupation': ['Job 11'], 'Daily Steps': (2000, 9000)}
+    steps = index.plan(selection)
+    assert [step[2] for step in steps] == sorted(step[2] for step in steps)
+    for column, operand, estimate in steps:
+        assert estimate == len(naive_rows(df, {column: operand if isinstance(operand, tuple) else list(operand)}))
+
+
+def test_sorted_union():
+    n_rows = 1000
+    sparse = [np.array([5, 9]), np.array([1, 7, 20])]
+    assert _sorted_union(sparse, n_rows).tolist() == [1, 5, 7, 9, 20]
+    dense = [np.arange(0, n_rows, 2), np.arange(1, n_rows // 2, 2)]
+    assert sum(map(len, dense)) > n_rows * DENSE_FRACTION
+    assert np.array_equal(_sorted_union(dense, n_rows), np.union1d(*dense))
+    assert len(_sorted_union([], n_rows)) == 0
+    assert _sorted_union([sparse[0]], n_rows) is sparse[0]
+
+
+def test_matches_treats_missing_as_no_match():
+    df = synthetic(500)
+    index = FilterIndex(df)
+    occupations = frozenset(CATEGORIES['Occupation'])
+    assert np.array_equal(index._matches('Occupation', occupations), df['Occupation'].notna().to_numpy())
+    assert np.array_equal(index._matches('Heart Rate', (0, 200)), df['Heart Rate'].notna().to_numpy())
+    positions = np.array([3, 10, 42])
+    assert np.array_equal(index._matches('Gender', frozenset(['Female']), positions),
+                          (df['Gender'].to_numpy()[positions] == 'Female'))
+
+
+def test_extended_equals_fresh_index():
+    df = synthetic(3000, seed=1)
+    index = FilterIndex(df.iloc[:1000])
+    for start, stop in ((1000, 1001), (1001, 1001), (1001, 2500), (2500, 3000)):
+        index = index.extended(df.iloc[start:stop].reset_index(drop=True))
+    fresh = FilterIndex(df)
+    for column in fresh.columns:
+        assert index.values(column) == fresh.values(column)
+        assert np.array_equal(index.codes[column], fresh.codes[column])
+    for column in fresh.range_columns:
+        for attr in ('order', 'uniques', 'offsets'):
+            assert np.array_equal(getattr(index.ranges[column], attr), getattr(fresh.ranges[column], attr))
+    assert_matches_naive(index, df, random.Random(1), trials=100)
+
+
+def test_memo_is_bounded_by_bytes():
+    df = synthetic(5000)
+    index = FilterIndex(df, cache_bytes=4096)
+    rng = random.Random(2)
+    for _ in range(200):
+        index.rows(random_selection(rng, df))
+        assert index._lookup.current_bytes <= 4096
+    # Results above the per-entry share of the budget are not stored
+    index.clear_cache()
+    index.rows({'Gender': 'Female'})
+    assert index._lookup.current_bytes == 0
+
+
+def test_saved_index_loads_memory_mapped(tmp_path):
+    df = synthetic(2000, seed=3)
+    FilterIndex(df).save(tmp_path / 'v1.index')
+    index = FilterIndex.load(tmp_path / 'v1.index', df)
+    assert isinstance(index.codes['Gender'], np.memmap)
+    assert index.values('Occupation') == FilterIndex(df).values('Occupation')
+    assert_matches_naive(index, df, random.Random(3), trials=100)
+    with pytest.raises(ValueError):
+        FilterIndex.load(tmp_path / 'v1.index', df.head(10))
+
+
+def test_split_index_matches_one_index():
+    df = synthetic(3000, seed=4)
+    base, tail = df.iloc[:2500], df.iloc[2500:].reset_index(drop=True)
+    index = SplitIndex(FilterIndex(base), FilterIndex(tail.iloc[:100])).extended(tail.iloc[100:])
+    fresh = FilterIndex(df)
+    assert index.n_rows == len(df)
+    for column in fresh.columns:
+        assert set(index.values(column)) == set(fresh.values(column))
+    for column in fresh.range_columns:
+        assert index.value_range(column) == fresh.value_range(column)
+    assert_matches_naive(index, df, random.Random(4), trials=200)
+
+
+def test_split_index_with_predicates_spanning_a_part():
+    df = synthetic(600, seed=5)
+    df.loc[500:, 'Age'] = 40.0
+    index = SplitIndex(FilterIndex(df.iloc[:500]), FilterIndex(df.iloc[500:].reset_index(drop=True)))
+    for selection in ({'Age': (35, 45)}, {'Age': (35, 45), 'Stress Level': (0, 100)}):
+        assert np.array_equal(index.rows(selection), naive_rows(df, selection))
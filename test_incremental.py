@@ -0,0 +1,124 @@
+"""Appended rows folded in batch by batch against a fresh load of the same rows"""
+import random
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from density import DensityGrids
+from filter_index import FilterIndex
+from incremental import PUBLISH_FRACTION, LiveDataset
+
+DATA_FILE = Path(__file__).parent / 'Sleep_health_and_lifestyle_dataset.csv'
+
+PAIRS = [('Sleep Duration', 'Quality of Sleep'), ('Daily Steps', 'Stress Level')]
+
+SELECTIONS = [
+    {'Occupation': ['Nurse', 'Doctor']},
+    {'Age Group': '40-49', 'Age': (30, 45)},
+    {'Sleep Disorder Status': ['No Disorder'], 'Daily Steps': (6000, 20000), 'Gender': 'Male'},
+]
+
+
+def new_rows(source, start_id, n_rows, seed):
+    rows = source.sample(n_rows, replace=True, random_state=seed).reset_index(drop=True)
+    rows['Person ID'] = np.arange(start_id, start_id + n_rows)
+    rows.loc[::3, 'Sleep Disorder'] = np.nan
+    return rows
+
+
+def append(path, text):
+    with open(path, 'a', newline='') as f:
+        f.write(text)
+
+
+def assert_matches_fresh_load(snapshot, reference_csv, cache_dir):
+    fresh = LiveDataset(reference_csv, cache_dir, density_pairs=PAIRS).snapshot
+    expected = fresh.frame()
+    pd.testing.assert_frame_equal(snapshot.frame().reset_index(drop=True), expected)
+    index = FilterIndex(expected)
+    for selection in SELECTIONS:
+        assert np.array_equal(snapshot.index.rows(selection), index.rows(selection))
+        pd.testing.assert_frame_equal(snapshot.select(selection).reset_index(drop=True),
+                                      expected.take(index.rows(selection)).reset_index(drop=True))
+    rng = random.Random(0)
+    for column in index.range_columns:
+        assert snapshot.index.value_range(column) == index.value_range(column)
+        low, high = sorted(rng.uniform(*index.value_range(column)) for _ in range(2))
+        assert np.array_equal(snapshot.index.rows({column: (low, high)}),
+                              index.rows({column: (low, high)}))
+    pd.testing.assert_series_equal(snapshot.cube.count('Occupation').sort_index(),
+                                   fresh.cube.count('Occupation').sort_index())
+    pd.testing.assert_series_equal(
+        snapshot.cube.mean('Sleep Duration', by='Occupation').sort_index(),
+        fresh.cube.mean('Sleep Duration', by='Occupation').sort_index())
+    for selection in ({}, {'Gender': 'Female'}):
+        pd.testing.assert_frame_equal(snapshot.moments.where(selection).correlation(),
+                                      fresh.moments.where(selection).correlation())
+    density = DensityGrids.from_frame(expected, PAIRS, axes=snapshot.density.axes)
+    for pair in PAIRS:
+        assert np.array_equal(snapshot.density.where(pair, {'Gender': 'Male'}),
+                              density.where(pair, {'Gender': 'Male'}))
+
+
+def test_batches_match_fresh_load(tmp_path):
+    csv_path = tmp_path / 'live.csv'
+    reference_csv = tmp_path / 'reference.csv'
+    shutil.copy(DATA_FILE, csv_path)
+    shutil.copy(DATA_FILE, reference_csv)
+    source = pd.read_csv(DATA_FILE)
+    live = LiveDataset(csv_path, tmp_path / 'cache', density_pairs=PAIRS)
+    start_id = int(source['Person ID'].max()) + 1
+    publish_at = int(len(source) * PUBLISH_FRACTION)
+    versions = []
+    # The source has no trailing newline; the first batch starts the next line
+    lead = '\n'
+    for batch_number, n_rows in enumerate((1, 10, publish_at, 5, 20)):
+        rows = new_rows(source, start_id, n_rows, seed=batch_number)
+        start_id += n_rows
+        text = lead + rows.to_csv(index=False, header=False)
+        lead = ''
+        append(csv_path, text)
+        append(reference_csv, text)
+        snapshot = live.refresh()
+        versions.append(snapshot.version)
+        assert snapshot.n_rows == len(pd.read_csv(reference_csv))
+        assert_matches_fresh_load(snapshot, reference_csv, tmp_path / f'fresh-{batch_number}')
+    assert live.full_reloads == 1
+    assert len(set(versions)) == len(versions)
+    # A batch crossed the publish threshold: its rows moved into the base
+    assert len(snapshot.tail) < snapshot.n_rows - len(source)
+
+
+def test_partial_and_rejected_rows(tmp_path):
+    csv_path = tmp_path / 'live.csv'
+    reference_csv = tmp_path / 'reference.csv'
+    shutil.copy(DATA_FILE, csv_path)
+    shutil.copy(DATA_FILE, reference_csv)
+    source = pd.read_csv(DATA_FILE)
+    live = LiveDataset(csv_path, tmp_path / 'cache', density_pairs=PAIRS)
+    start_id = int(source['Person ID'].max()) + 1
+    good = new_rows(source, start_id, 4, seed=7)
+    lines = good.to_csv(index=False, header=False).splitlines(keepends=True)
+    bad = new_rows(source, start_id + 10, 2, seed=8)
+    bad['Heart Rate'] = bad['Heart Rate'].astype(str)
+    bad.loc[0, 'Heart Rate'] = 'n/a'
+    bad['Age'] = bad['Age'].astype(str)
+    bad.loc[1, 'Age'] = ''
+
+    # A row cut off mid-line waits for its newline
+    half = len(lines[0]) // 2
+    append(csv_path, '\n' + lines[0][:half])
+    assert live.refresh().n_rows == len(source)
+    append(csv_path, lines[0][half:] + bad.to_csv(index=False, header=False) + ''.join(lines[1:3]))
+    snapshot = live.refresh()
+    assert live.rows_rejected == 2
+    # Re-sent rows are below the watermark and dropped
+    append(csv_path, lines[3] + lines[1])
+    snapshot = live.refresh()
+    assert snapshot.n_rows == len(source) + 4
+    assert live.full_reloads == 1
+
+    append(reference_csv, '\n' + ''.join(lines))
+    assert_matches_fresh_load(snapshot, reference_csv, tmp_path / 'fresh')
@@ -0,0 +1,39 @@
+"""Chunked ingest with missing cells"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ingest import ingest_summaries, iter_chunks
+
+DATA_FILE = Path(__file__).parent / 'Sleep_health_and_lifestyle_dataset.csv'
+
+
+def write_with_gaps(path):
+    df = pd.read_csv(DATA_FILE)
+    df.loc[0, 'Blood Pressure'] = np.nan
+    df.loc[1, 'Blood Pressure'] = 'n/a'
+    df.loc[2, 'Heart Rate'] = np.nan
+    df.loc[3, 'Age'] = np.nan
+    df.to_csv(path, index=False)
+    return df
+
+
+def test_missing_cells_stay_missing(tmp_path):
+    csv_path = tmp_path / 'gaps.csv'
+    source = write_with_gaps(csv_path)
+    chunk = pd.concat(iter_chunks(csv_path, 100), ignore_index=True)
+    assert len(chunk) == len(source)
+    assert chunk.loc[:1, ['Systolic BP', 'Diastolic BP']].isna().all().all()
+    assert chunk.loc[2:, ['Systolic BP', 'Diastolic BP']].notna().all().all()
+    assert pd.isna(chunk.loc[2, 'Heart Rate'])
+    assert pd.isna(chunk.loc[3, 'Age']) and pd.isna(chunk.loc[3, 'Age Group'])
+    systolic = source['Blood Pressure'].str.partition('/')[0]
+    assert chunk.loc[2:, 'Systolic BP'].astype(int).tolist() == systolic[2:].astype(int).tolist()
+
+
+def test_summaries_cover_every_row(tmp_path):
+    csv_path = tmp_path / 'gaps.csv'
+    source = write_with_gaps(csv_path)
+    cube, moments, report = ingest_summaries(csv_path, chunksize=100)
+    assert report.rows == cube.count() == len(source)